@@ -0,0 +1,164 @@
+"""Benchmark of the diagram generation on a synthetic corpus.
+
+usage: python benchmark.py [--sizes 100 1000] [--layouts grid force] [-o benchmark.json]
+
+Every case is a generated project of the given number of classes; the time spent in each
+step, the size of the output and the layout metrics are printed and saved as json.
+"""
+import argparse
+import json
+import random
+import time
+
+import colour
+
+import src as diagramTool
+
+VISIBILITIES = ["public", "private", "protected"]
+
+# texts holding every character the renderers escape, and characters outside of ascii
+SPECIAL_TEXTS = ["a&b", "list<T>", 'say "hi"', "it's", "x]]>y", "tab\there", "cr\rhere", "new\nline", "café 日本 🙂", "&amp;"]
+
+
+def generateProject(size : int, seed : int = 0) -> dict:
+    """Parsed-source dictionary of `size` classes, in the format of the python parser.
+
+    Most classes inherit from a recent class, some compose or aggregate one; there are
+    `size // 50` enums, and about one class in 40 starts a new inheritance tree.
+    """
+    rnd = random.Random(seed)
+    classes = {}
+    for i in range(size):
+        name = f"Class{i}"
+        parents = []
+        if i > 0 and rnd.random() > 0.025:
+            parents = [f"Class{rnd.randrange(max(0, i - 50), i)}"]
+        attributes = {
+            f"attribute{j}": {"type": rnd.choice(["int", "str", "list[int]"]), "visibility": rnd.choice(VISIBILITIES)}
+            for j in range(rnd.randrange(0, 6))
+        }
+        methods = {
+            f"{name}.method{j}": {
+                "args": [{"name": "value", "type": "int"}],
+                "return_type": rnd.choice(["None", "str", "bool"]),
+                "isStatic": False,
+                "visibility": rnd.choice(VISIBILITIES)
+            }
+            for j in range(rnd.randrange(0, 6))
+        }
+        classes[name] = {
+            "methods": methods, "attributes": attributes, "properties": {},
+            "inheritFrom": parents, "inheritedBy": [], "composition": [], "aggregation": []
+        }
+    names = list(classes)
+    for i, name in enumerate(names[1:], start=1):
+        if rnd.random() < 0.2:
+            classes[name]["composition"] = [rnd.choice(names[max(0, i - 30):i])]
+        if rnd.random() < 0.2:
+            classes[name]["aggregation"] = [rnd.choice(names[max(0, i - 30):i])]
+    for name, data in classes.items():
+        for parent in data["inheritFrom"]:
+            classes[parent]["inheritedBy"].append(name)
+    enums = {
+        f"Enum{i}": {"values": ["A", "B", "C", "D"][:rnd.randrange(1, 5)], "methods": {}, "properties": {}}
+        for i in range(size // 50)
+    }
+    return {"classes": classes, "enums": enums, "functions": {}, "globalVariables": {}}
+
+
+def generateSpecialProject() -> dict:
+    """Parsed-source dictionary of a few classes and enums whose names, members and values are the SPECIAL_TEXTS"""
+    classes = {}
+    for i, text in enumerate(SPECIAL_TEXTS):
+        name = f"Class{i} {text}"
+        classes[name] = {
+            "methods": {f"{name}.{text}": {"args": [{"name": text, "type": text}], "return_type": text, "isStatic": False, "visibility": "public"}},
+            "attributes": {text: {"type": text, "visibility": VISIBILITIES[i % 3]}},
+            "properties": {},
+            "inheritFrom": [f"Class{i - 1} {SPECIAL_TEXTS[i - 1]}"] if i > 0 else [],
+            "inheritedBy": [], "composition": [], "aggregation": []
+        }
+    for name, data in classes.items():
+        for parent in data["inheritFrom"]:
+            classes[parent]["inheritedBy"].append(name)
+    enums = {f"Enum {text}": {"values": [text, f"{text}2"], "methods": {}, "properties": {}} for text in SPECIAL_TEXTS[:3]}
+    return {"classes": classes, "enums": enums, "functions": {}, "globalVariables": {}}
+
+
+def checkEscaping(jobs : int = 1) -> None:
+    """check that every renderer escapes the SPECIAL_TEXTS as lxml does, with and without level of detail"""
+    svg = diagramTool.createDiagram(generateSpecialProject(), colour.Color('black'), diagramTool.LAYOUT.GRID)
+    for lod in (False, True):
+        compareRenderers(svg, jobs, lod)
+
+
+def runCase(size : int, layout : diagramTool.LAYOUT, jobs : int = 1) -> dict:
+    data = generateProject(size)
+    profile = diagramTool.Profile()
+    start = time.perf_counter()
+    svg = diagramTool.createDiagram(data, colour.Color('black'), layout, profile=profile)
+    with profile.step("render"):
+        output = svg.toString()
+    total = time.perf_counter() - start
+    with profile.step("metrics"):
+        metrics = svg.metrics()
+    return {
+        "size": size,
+        "layout": str(layout),
+        "total": round(total, 4),
+        "steps": {name: round(duration, 4) for name, duration in profile.steps.items()},
+        "bytes": len(output.encode("utf-8")),
+        "metrics": metrics.asDict(),
+        "renderers": compareRenderers(svg, jobs)
+    }
+
+
+def compareRenderers(svg : diagramTool.SVG, jobs : int = 1, lod : bool = False) -> dict:
+    """time each renderer, indented and minified, and with `jobs` processes, and check that they all write the same text"""
+    timings = {}
+    cases = [(renderer, 1) for renderer in diagramTool.RENDERER]
+    if jobs > 1:
+        cases += [(renderer, jobs) for renderer in diagramTool.RENDERER]
+    for minify in (False, True):
+        outputs = {}
+        for renderer, caseJobs in cases:
+            name = f"{renderer}{f'-jobs{caseJobs}' if caseJobs > 1 else ''}{'-minify' if minify else ''}"
+            start = time.perf_counter()
+            outputs[name] = svg.toString(minify=minify, renderer=renderer, jobs=caseJobs, lod=lod)
+            timings[name] = round(time.perf_counter() - start, 4)
+        reference = outputs[f"{diagramTool.RENDERER.LXML}{'-minify' if minify else ''}"]
+        for name, output in outputs.items():
+            if output != reference:
+                raise AssertionError(f"{name} does not write the same svg as lxml")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the diagram generation on a synthetic corpus')
+    parser.add_argument('--sizes', type=int, nargs='+', help='number of classes of each generated project', default=[100, 1000])
+    parser.add_argument('--layouts', type=diagramTool.LAYOUT, nargs='+', choices=list(diagramTool.LAYOUT), help='layouts to benchmark', default=[diagramTool.LAYOUT.FORCE])
+    parser.add_argument('--jobs', type=int, metavar='N', help='also time the rendering by N processes', default=1)
+    parser.add_argument('-o', '--output', type=str, help='file where the results are saved', default='benchmark.json')
+    args = parser.parse_args()
+
+    checkEscaping(args.jobs)
+    print("renderers escape special characters as lxml does")
+
+    results = []
+    for size in args.sizes:
+        for layout in args.layouts:
+            result = runCase(size, layout, args.jobs)
+            results.append(result)
+            metrics = result["metrics"]
+            print(f"{size:>6} classes  {str(layout):<6} {result['total']:>8.3f}s  {result['bytes']:>10} bytes  "
+                  f"{metrics['crossings']} crossings, {metrics['boxCrossings']} through boxes, {metrics['overlaps']} overlaps, "
+                  f"fill {metrics['fillRatio']:.1%}")
+            print("        render  " + ", ".join(f"{name} {duration:.3f}s" for name, duration in result["renderers"].items()))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
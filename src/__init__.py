@@ -1,3 +1,3 @@
 from .python import parse as parse_python
-from .svg import SVG, createDiagram
+from .svg import SVG, createDiagram, saveSharded, LAYOUT, ROUTER, RENDERER, MemberLimits, LayoutState, LayoutCache, Profile, LayoutMetrics
 from .main import fromSource
\ No newline at end of file
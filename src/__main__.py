@@ -6,6 +6,21 @@ from gamuLogger import Logger, LEVELS
 Logger.setModule("DiagramTool.")
 
 from .main import fromSource
+from .svg import LAYOUT, ROUTER, RENDERER
+
+
+def duration(value : str) -> float:
+    """parse a duration like '2s', '500ms' or '1.5' (seconds)"""
+    try:
+        if value.endswith('ms'):
+            seconds = float(value[:-2]) / 1000
+        else:
+            seconds = float(value.removesuffix('s'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value!r}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f"duration must be positive: {value!r}")
+    return seconds
 
 
 class Chronometer:
@@ -31,6 +46,26 @@ def buildArgParser() -> argparse.ArgumentParser:
     parser.add_argument('--save-ast', action='store_true', help='save ast to file', default=False)
     parser.add_argument('--show-border', action='store_true', help='show border around the image', default=False)
     parser.add_argument('-c', '--color', type=str, help='color of the diagram', default='black')
+    parser.add_argument('--layout', type=LAYOUT, choices=list(LAYOUT), help='layout algorithm used to place the classes (auto: chosen for each group of classes from its size)', default=LAYOUT.AUTO)
+    parser.add_argument('--router', type=ROUTER, choices=list(ROUTER), help='how relations are drawn (orthogonal: around the other boxes)', default=ROUTER.ELBOW)
+    parser.add_argument('--incremental', action='store_true', help='keep unchanged classes where they were on the previous run (layout saved next to the output)', default=False)
+    parser.add_argument('--layout-cache', type=str, metavar='DIR', help='directory where layouts are cached, to be reused by runs with the same classes and relations', default=None)
+    parser.add_argument('--layout-budget', type=duration, metavar='TIME', help='maximum time spent laying the classes out, like 2s or 500ms', default=None)
+    parser.add_argument('--attempts', type=int, metavar='K', help='number of randomized layouts tried for each group of classes, the best one is kept', default=1)
+    parser.add_argument('--seed', type=int, help='seed of the randomized layouts, for reproducible results', default=None)
+    parser.add_argument('--minify', action='store_true', help='write the svg without indentation, with rounded coordinates', default=False)
+    parser.add_argument('--precision', type=int, metavar='DIGITS', help='decimals kept in the coordinates with --minify', default=1)
+    parser.add_argument('--compress', action='store_true', help='gzip the output (always done for a .svgz output)', default=False)
+    parser.add_argument('--renderer', type=RENDERER, choices=list(RENDERER), help='how the svg is written (fast: from text templates, same output)', default=RENDERER.LXML)
+    parser.add_argument('--jobs', type=int, metavar='N', help='processes rendering the svg of a large diagram, or the pages with --shard', default=1)
+    parser.add_argument('--lod', action='store_true', help='show the members of the classes only when zoomed in (needs a browser running the svg script)', default=False)
+    parser.add_argument('--shard', action='store_true', help='save one page per package, linked from an overview of the packages saved to the output', default=False)
+    parser.add_argument('--shard-depth', type=int, metavar='N', help='with --shard, number of leading parts of the dotted module names forming a package (the whole module by default)', default=None)
+    parser.add_argument('--patch', action='store_true', help='update the previous output, building again only the classes that changed and their relations (implies --incremental)', default=False)
+    parser.add_argument('--max-members', type=int, metavar='N', help='rows shown in each section of a box, the others counted in a last row', default=None)
+    parser.add_argument('--public-only', action='store_true', help='hide the private and protected members', default=False)
+    parser.add_argument('--collapse', action='store_true', help='show the classes and enums by their name only, without their members', default=False)
+    parser.add_argument('--profile', action='store_true', help='print the time spent in each step', default=False)
     return parser
 
 
@@ -48,7 +83,7 @@ def main():
     chrono = Chronometer()
     try:
         with chrono:
-            fromSource(args.source, args.output, args.save_ast, args.dump, args.show_border, color)
+            fromSource(args.source, args.output, args.save_ast, args.dump, args.show_border, color, args.layout, args.incremental, args.layout_cache, args.layout_budget, args.attempts, args.seed, args.router, args.minify, args.precision, args.compress, args.renderer, args.jobs, args.lod, args.shard, args.shard_depth, args.patch, args.max_members, args.public_only, args.collapse, args.profile)
     except Exception as e:
         Logger.critical(f"An error occured: {e}\n{traceback.format_exc()}")
         exit(1)
@@ -1,10 +1,11 @@
+import os
 import sys
 from enum import Enum
 from typing import Callable
 import colour
 
 from .python import parse as parse_python
-from .svg import createDiagram
+from .svg import createDiagram, saveSharded, reusable, remember, LAYOUT, ROUTER, RENDERER, MemberLimits, LayoutState, LayoutCache, Profile
 
 from gamuLogger import Logger
 
@@ -48,14 +49,16 @@ def getParser(language : LANGUAGES) -> Callable[[str, bool, bool], dict[str, str
 
 
 
-def fromSource(source : str, output : str, save_ast : bool = False, dump : bool = False, showBorder : bool = False, color : colour.Color = colour.Color('black')) -> None:
+def fromSource(source : str, output : str, save_ast : bool = False, dump : bool = False, showBorder : bool = False, color : colour.Color = colour.Color('black'), layout : LAYOUT = LAYOUT.AUTO, incremental : bool = False, cacheDir : str | None = None, layout_budget : float | None = None, attempts : int = 1, seed : int | None = None, router : ROUTER = ROUTER.ELBOW, minify : bool = False, precision : int = 1, compress : bool = False, renderer : RENDERER = RENDERER.LXML, jobs : int = 1, lod : bool = False, shard : bool = False, shardDepth : int | None = None, patch : bool = False, maxMembers : int | None = None, publicOnly : bool = False, collapse : bool = False, profile : bool = False) -> None:
     """entry point for the module"""
     
     language = getFileLanguage(source)
     Logger.debug(f"detected language: {language}")
     parser = getParser(language)
     
-    data = parser(source, True, dump)
+    timings = Profile()
+    with timings.step("parse"):
+        data = parser(source, True, dump)
     
     if save_ast:
         with open("ast.json", 'w') as f:
@@ -63,8 +66,41 @@ def fromSource(source : str, output : str, save_ast : bool = False, dump : bool
             json.dump(data, f, indent=4)
         Logger.info("saved ast to ast.json because of --save-ast flag")
 
-    svg = createDiagram(data, color)
-    svg.save(output, showBorder=showBorder)
+    # smaller boxes: fewer rows per section, only the public members, or no member at all
+    limits = MemberLimits(maxMembers, publicOnly, collapse)
+
+    # one page per package, and an overview of the packages in `output`
+    if shard:
+        if patch:
+            Logger.warning("--patch is not available with --shard, every page is written again")
+        with timings.step("save"):
+            saveSharded(data, output, color, layout, shardDepth, incremental, cacheDir, layout_budget, attempts, seed, router, jobs, limits,
+                        showBorder=showBorder, minify=minify, precision=precision, compress=compress, renderer=renderer, lod=lod)
+        if profile:
+            Logger.info(timings.report())
+        return
+
+    # keep the position of unchanged elements from the previous run
+    state = LayoutState.load(LayoutState.pathFor(output)) if incremental or patch else None
+    previous = LayoutState(state.elements, state.layout, state.digests, state.relations, state.options) if patch and state is not None else None
+    options = {'minify': minify, 'precision': precision if minify else None, 'lod': lod, 'router': str(router)}
+
+    # reuse the layout of a previous run with the same classes and relations
+    cache = LayoutCache(cacheDir) if cacheDir is not None else None
+
+    svg = createDiagram(data, color, layout, state, cache, layout_budget, attempts, seed, router, timings, limits)
+    with timings.step("save"):
+        # with `patch`, the nodes of the elements that did not change are copied from the previous output
+        reuse = reusable(svg.items, previous, output, options) if previous is not None and os.path.exists(output) else None
+        svg.save(output, showBorder=showBorder, minify=minify, precision=precision, compress=compress, renderer=renderer, jobs=jobs, lod=lod, reuse=reuse)
+    
+    if state is not None:
+        remember(state, svg.items, options)
+        state.save(LayoutState.pathFor(output))
     
     Logger.info(f"saved diagram to {output}")
+    if profile:
+        with timings.step("metrics"):
+            timings.note(f"metrics: {svg.metrics()}")
+        Logger.info(timings.report())
         
\ No newline at end of file
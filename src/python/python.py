@@ -154,6 +154,14 @@ def mergeList(l1 : list, l2 : list) -> list:
 PARSED_FILES = [] #type: list[str]
 
 
+def moduleOf(file : str) -> str:
+    """dotted module of a source file, from its path relative to the working directory"""
+    parts = [part for part in Path(os.path.relpath(file)).with_suffix("").parts if part not in (".", "..")]
+    if parts and parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
 
 def getAllClasses(node : ast.AST, file : str, parseIncludedFiles : bool = False) -> list[str]:
     classes = []
@@ -251,6 +259,7 @@ def parseTree(node : ast.AST, file : str, classes : list[str], parseIncludedFile
                 },
                 "inheritFrom": ["ParentClass"],
                 "inheritedBy": ["ChildClass"],
+                "module": "package.module" # module of the file defining the class
             }
             "ClassName2": {
                 ...
@@ -264,7 +273,8 @@ def parseTree(node : ast.AST, file : str, classes : list[str], parseIncludedFile
                 "values": ["value1", "value2"],
                 "methods": {
                     ... # same as class methods
-                }
+                },
+                "module": "package.module"
             }
         },
         "functions": {
@@ -312,6 +322,7 @@ def parseTree(node : ast.AST, file : str, classes : list[str], parseIncludedFile
     }    
 
     importedFiles = []
+    module = moduleOf(file)
     
     def getArgTypes(node : ast.AST) -> set[str]:
         """return the types of an argument of a function"""
@@ -385,7 +396,8 @@ def parseTree(node : ast.AST, file : str, classes : list[str], parseIncludedFile
         result["enums"][".".join(parentStack + [str(node.name)])] = {
             "values": values,
             "methods": methods,
-            "properties": properties
+            "properties": properties,
+            "module": module
         }
 
 
@@ -510,7 +522,8 @@ def parseTree(node : ast.AST, file : str, classes : list[str], parseIncludedFile
             "inheritedBy": [],
             "properties": properties,
             "aggregation": aggregation_contain,
-            "composition": composition_contain
+            "composition": composition_contain,
+            "module": module
         }
 
     def parseClassOrEnum(node : ast.ClassDef, parentStack : list[str] = []) -> None:
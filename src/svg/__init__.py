@@ -1,4 +1,14 @@
 from .svg import SVG
 from .utils import createMissingClasses
-from .customTypes import Class, Enum, Relation, Element
+from .customTypes import Class, Enum, Relation, Element, MemberLimits
+from .layout import LAYOUT
+from .model import DiagramModel
+from .state import LayoutState
+from .cache import LayoutCache
+from .profiling import Profile
+from .metrics import LayoutMetrics, computeMetrics
+from .routing import ROUTER
+from .render import RENDERER
+from .shards import saveSharded
+from .patch import reusable, remember
 from .main import createDiagram
\ No newline at end of file
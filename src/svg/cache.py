@@ -0,0 +1,97 @@
+import contextlib
+import hashlib
+import json
+import os
+
+try:
+    from .layout import LAYOUT
+    from .model import DiagramModel
+except ImportError:
+    from layout import LAYOUT
+    from model import DiagramModel
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Cache")
+
+CACHE_VERSION = 1
+MAX_ENTRIES = 256
+
+
+class LayoutCache:
+    """Final positions of previous layouts, stored as one json file per layout in `directory`.
+
+    Entries are keyed by a hash of the element names and sizes, the relations and the layout
+    options; the least recently used entries are evicted past `maxEntries`.
+    """
+    def __init__(self, directory : str, maxEntries : int = MAX_ENTRIES):
+        self.directory = directory
+        self.maxEntries = maxEntries
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model : DiagramModel, layout : LAYOUT, **options) -> str:
+        """canonical hash of the model structure and the layout options, independent of the element order"""
+        names = [element.name for element in model.elements]
+        relations = sorted(
+            (kind, names[i], names[target])
+            for kind, adjacency in (('inheritance', model.inheritance), ('composition', model.composition), ('aggregation', model.aggregation), ('dependency', model.dependency))
+            for i, targets in enumerate(adjacency)
+            for target in targets
+        )
+        content = json.dumps({
+            'version': CACHE_VERSION,
+            'layout': str(layout),
+            'options': options,
+            'elements': sorted((element.name, element.width, element.height) for element in model.elements),
+            'relations': relations
+        }, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def __path(self, key : str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key : str) -> dict[str, tuple[int, int]] | None:
+        """return the cached positions, of the form {name: (x, y)}, or None on a miss"""
+        path = self.__path(key)
+        try:
+            with open(path, 'r') as f:
+                positions = {name: (x, y) for name, (x, y) in json.load(f).items()}
+        except FileNotFoundError:
+            Logger.debug(f"Layout cache miss for {key[:12]}")
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            Logger.warning(f"Ignoring corrupted layout cache entry {path}: {e}")
+            return None
+        with contextlib.suppress(OSError): # evicted by a concurrent run since it was read
+            os.utime(path) # mark as recently used
+        Logger.debug(f"Layout cache hit for {key[:12]}")
+        return positions
+
+    def put(self, key : str, positions : dict[str, tuple[int, int]]) -> None:
+        # write then rename, so that concurrent runs never read a partial entry
+        path = self.__path(key)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w') as f:
+            json.dump({name: list(position) for name, position in positions.items()}, f, separators=(',', ':'))
+        os.replace(temp, path)
+        self.__evict()
+
+    def __evict(self) -> None:
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        if len(entries) <= self.maxEntries:
+            return
+        entries.sort(key=_mtime)
+        for entry in entries[:len(entries) - self.maxEntries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass # removed by a concurrent run
+        Logger.debug(f"Evicted {len(entries) - self.maxEntries} layout cache entries")
+
+
+def _mtime(entry : os.DirEntry) -> float:
+    """time of last use of a cache entry, 0 if a concurrent run removed it"""
+    try:
+        return entry.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
@@ -1,32 +1,186 @@
 # import xml.etree.ElementTree as ET
-import itertools
 import lxml.etree as ET
 import xml.etree.ElementTree as ETX
 from enum import Enum
-import colour
+from typing import Any
 
 try:
-    from .utils import getTextWidth, getTextHeight, Attribute2Text, Method2Text
+    from .utils import getTextHeight, Attribute2Text, Method2Text
+    from .text import textWidth, textWidths
+    from .spatial import intersects
+    from .geometry import STEP, STEP_DIRECTIONS
 except ImportError:
-    from utils import getTextWidth, getTextHeight, Attribute2Text, Method2Text
+    from utils import getTextHeight, Attribute2Text, Method2Text
+    from text import textWidth, textWidths
+    from spatial import intersects
+    from geometry import STEP, STEP_DIRECTIONS
 
 TITLE_FONT_SIZE = 26
 ATTRIBUTE_FONT_SIZE = 20
 SEPARATOR_HEIGHT = 20
+TEXT_PADDING = 5 # space between the rows of text and the left and right borders
 
-def Separator(x : int, y : int, width : int, color : str = 'black') -> ETX.Element:   
+# presentation of every node of the diagram, by class; the nodes only carry their positions
+STYLESHEET = f"""
+text {{ fill: currentColor; stroke: none; font-size: {ATTRIBUTE_FONT_SIZE}px; }}
+.className, .enumName {{ font-size: {TITLE_FONT_SIZE}px; text-anchor: middle; }}
+.enumSurTitle {{ text-anchor: middle; font-style: italic; }}
+.border, .separator, .relation, marker * {{ fill: none; stroke: currentColor; stroke-width: 1; }}
+.dashed {{ stroke-dasharray: 5,5; }}
+marker .filled {{ fill: currentColor; }}
+"""
+
+# level of detail: the member rows of the boxes are hidden while the diagram is drawn smaller than this scale, in CSS pixels
+LOD_SCALE = 0.5
+LOD_STYLESHEET = """
+.overview .members { display: none; }
+"""
+# keeps the `overview` class of the root in step with the scale the diagram is drawn at;
+# where scripts do not run (an <img>), the diagram stays an overview
+LOD_SCRIPT = f"""
+(function () {{
+    var script = document.currentScript;
+    var svg = (script && script.ownerSVGElement) || document.documentElement;
+    function update() {{
+        var matrix = svg.getScreenCTM();
+        var scale = (matrix ? matrix.a : 1) * (window.visualViewport ? window.visualViewport.scale : 1);
+        svg.classList.toggle("overview", scale < {LOD_SCALE});
+    }}
+    window.addEventListener("resize", update);
+    if (window.visualViewport) {{
+        window.visualViewport.addEventListener("resize", update);
+    }}
+    update();
+}})();
+"""
+
+
+def Number(value : float, precision : int | None = None) -> str:
+    """a coordinate as written in the SVG: as is, or rounded to `precision` decimals without trailing zeros"""
+    if precision is None:
+        return f"{value}"
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def Style(minify : bool = False, lod : bool = False) -> ETX.Element:
+    stylesheet = STYLESHEET + LOD_STYLESHEET if lod else STYLESHEET
+    style = ET.Element("style", None, None)
+    style.text = " ".join(stylesheet.split()) if minify else stylesheet
+    return style #type: ignore
+
+
+def LodScript() -> ETX.Element:
+    """script showing the member rows of the boxes only once the diagram is drawn large enough, see LOD_SCALE"""
+    script = ET.Element("script", None, None)
+    script.text = ET.CDATA(LOD_SCRIPT)
+    return script #type: ignore
+
+
+def Separator(x : int, y : int, width : int) -> ETX.Element:   
     separator = ET.Element("line", None, None)
-    separator.attrib["x1"] = "0"
-    separator.attrib["y1"] = "0"
-    separator.attrib["x2"] = f"{width}"
-    separator.attrib["y2"] = "0"
-    separator.attrib["stroke"] = color
-    separator.attrib["stroke-width"] = "1"
-    separator.attrib["transform"] = f"translate({x} {y})"
+    separator.attrib["class"] = "separator"
+    separator.attrib["x1"] = f"{x}"
+    separator.attrib["y1"] = f"{y}"
+    separator.attrib["x2"] = f"{x + width}"
+    separator.attrib["y2"] = f"{y}"
     
     return separator #type: ignore
 
 
+def Border(width : int, height : int) -> ETX.Element:
+    border = ET.Element("rect", None, None)
+    border.attrib["class"] = "border"
+    border.attrib["width"] = f"{width}"
+    border.attrib["height"] = f"{height}"
+    
+    return border #type: ignore
+
+
+def Members(parent : ETX.Element) -> ETX.Element:
+    """group of the member rows of a box, appended to `parent`"""
+    members = ET.SubElement(parent, "g", None, None) #type: ignore
+    members.attrib["class"] = "members"
+    return members #type: ignore
+
+
+def Link(node : ETX.Element, href : str) -> ETX.Element:
+    """`node` in a hyperlink to `href`"""
+    link = ET.Element("a", None, None)
+    link.attrib["href"] = href
+    link.append(node)
+    return link #type: ignore
+
+
+def Title(text : str, cssClass : str, width : int, y : int, precision : int | None = None) -> ETX.Element:
+    """text centered over the width of a box"""
+    title = ET.Element("text", None, None)
+    title.text = text
+    title.attrib["class"] = cssClass
+    title.attrib["x"] = Number(width/2, precision)
+    title.attrib["y"] = f"{y}"
+    
+    return title #type: ignore
+
+
+class ROW_KIND(Enum):
+    """kind of a row of text in a box, also the class of its <text> node"""
+    ATTRIBUTE = "attribute"
+    PROPERTY = "property"
+    METHOD = "method"
+    VALUE = "value"
+
+
+class MemberLimits:
+    """Which member rows the boxes show.
+
+    At most `maxRows` rows per section, the others being counted by a last "… N more" row; only the
+    public members if `publicOnly`; no member at all if `collapse`, the box keeping its name only.
+    """
+    def __init__(self, maxRows : int | None = None, publicOnly : bool = False, collapse : bool = False):
+        self.maxRows = maxRows
+        self.publicOnly = publicOnly
+        self.collapse = collapse
+    
+    def visible(self, members : dict) -> list[tuple[str, dict]]:
+        """the members shown, as (name, data) pairs"""
+        return [(name, data) for name, data in members.items() if not self.publicOnly or data['visibility'] == "public"]
+    
+    def section(self, rows : list[tuple[str, 'ROW_KIND']]) -> list[tuple[str, 'ROW_KIND']]:
+        """the (text, kind) of the rows shown in a section of a box"""
+        if self.collapse:
+            return []
+        if self.maxRows is None or len(rows) <= self.maxRows:
+            return rows
+        return rows[:self.maxRows] + [(f"… {len(rows) - self.maxRows} more", rows[self.maxRows][1])]
+
+
+NO_LIMITS = MemberLimits()
+
+
+class Row:
+    """A row of text in a box, formatted and measured once"""
+    __slots__ = ("text", "kind", "width")
+    def __init__(self, text : str, kind : ROW_KIND, width : int):
+        self.text = text
+        self.kind = kind
+        self.width = width
+    
+    @staticmethod
+    def measure(texts : list[str], kinds : list[ROW_KIND]) -> list['Row']:
+        return [Row(text, kind, width) for text, kind, width in zip(texts, kinds, textWidths(texts, ATTRIBUTE_FONT_SIZE))]
+    
+    def build(self, y : int) -> ETX.Element:
+        row = ET.Element("text", None, None)
+        row.text = self.text
+        row.attrib["class"] = self.kind.value
+        row.attrib['x'] = f"{TEXT_PADDING}"
+        row.attrib['y'] = f"{y}"
+        return row #type: ignore
+
+
 class SIDE(Enum):
     N = 0
     S = 1
@@ -58,11 +212,13 @@ class Element:
         return ((side1[0] - side2[0])**2 + (side1[1] - side2[1])**2)**0.5
         
         
-    def build(self, color : colour.Color) -> ETX.Element:
-
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:
+        """SVG group of the element; coordinates are rounded to `precision` decimals if given.
+        With `lod`, the member rows are grouped apart, to be hidden while the diagram is zoomed out."""
         element = ET.Element("g", None, None)
         element.attrib["class"] = "element"
         element.attrib["id"] = self.name
+        element.attrib['transform'] = f"translate({Number(self.__x, precision)} {Number(self.__y, precision)})"
         
         return element #type: ignore
     
@@ -128,6 +284,11 @@ class Element:
     def height(self) -> int:
         return self._height
 
+    @property
+    def box(self) -> tuple[int, int, int, int]:
+        """bounding box, of the form (x, y, width, height)"""
+        return (self.__x, self.__y, self._width, self._height)
+
     @property
     def center(self) -> tuple[int, int]:
         return (self.__x + self._width//2, self.__y + self._height//2)
@@ -146,34 +307,22 @@ class Element:
                 raise ValueError("Invalid side")
 
     def getNearSide(self, x : int, y : int) -> tuple[tuple[int, int], SIDE]:
-        distance = {
-            SIDE.N : ((self.N[0] - x)**2 + (self.N[1] - y)**2),
-            SIDE.S : ((self.S[0] - x)**2 + (self.S[1] - y)**2),
-            SIDE.W : ((self.W[0] - x)**2 + (self.W[1] - y)**2),
-            SIDE.E : ((self.E[0] - x)**2 + (self.E[1] - y)**2)
-        }
-
-        side = min(distance, key=distance.get)
-        return self.getSide(side), side
+        """return the middle of the side nearest to (x, y), and that side; ties go to N, S, W then E"""
+        points = (self.N, self.S, self.W, self.E) # in the order of SIDE
+        distances = [(px - x)**2 + (py - y)**2 for px, py in points]
+        side = distances.index(min(distances))
+        return points[side], SIDE(side)
         
         
 
     def isOverlapping(self, other : 'Element') -> bool:
         if not self.placed or not other.placed:
             return False
-        # check if some point of self is inside other
-        return any(
-            other.__x <= x <= other.__x + other._width
-            and other.__y <= y <= other.__y + other._height
-            for x, y in itertools.product(
-                range(int(self.__x), int(self.__x + self._width), 10),
-                range(int(self.__y), int(self.__y + self._height), 10),
-            )
-        )
+        return intersects(self.box, other.box)
 
 class Class(Element):
-    __instances = {} # type: dict[str, Class]
-    def __init__(self, name : str, attributes : dict, properties : dict, methods : dict, inheritFrom : list, inheritedBy : list, composition : list, aggregation : list):
+    def __init__(self, name : str, attributes : dict, properties : dict, methods : dict, inheritFrom : list, inheritedBy : list, composition : list, aggregation : list,
+                 dependencies : list | None = None, limits : MemberLimits = NO_LIMITS):
         super().__init__(name)
         self.attributes = attributes
         self.properties = properties
@@ -182,270 +331,212 @@ class Class(Element):
         self.inheritedBy = inheritedBy
         self.composition = composition
         self.aggregation = aggregation
+        self.dependencies = dependencies or []
+        self.limits = limits
+        self.model = None # type: Any # the DiagramModel holding the class, set by the model
+        self.index = -1   # index of the class in its model
         
+        self.rows = self._calcRows() # attributes and properties, then methods
         self._width = self.__calcWidth()
         self._height = self.__calcHeight()
-        
-        Class.__instances[name] = self
+    
+    def _calcRows(self) -> list[Row]:
+        limits = self.limits
+        rows = limits.section([
+            *((Attribute2Text(key, data), ROW_KIND.ATTRIBUTE) for key, data in limits.visible(self.attributes)),
+            *((Attribute2Text(key, data), ROW_KIND.PROPERTY) for key, data in limits.visible(self.properties))
+        ])
+        rows += limits.section([(Method2Text(key, data), ROW_KIND.METHOD) for key, data in limits.visible(self.methods)])
+        return Row.measure([text for text, _ in rows], [kind for _, kind in rows])
          
     def __calcWidth(self) -> int:
-        maxLen = getTextWidth(self.name, TITLE_FONT_SIZE)
-        for key, data in self.attributes.items():
-            maxLen = max(maxLen, getTextWidth(Attribute2Text(key, data), ATTRIBUTE_FONT_SIZE))
-        for key in self.properties:
-            maxLen = max(maxLen, getTextWidth(Attribute2Text(key, self.properties[key]), ATTRIBUTE_FONT_SIZE))
-        for key in self.methods:
-            maxLen = max(maxLen, getTextWidth(Method2Text(key, self.methods[key]), ATTRIBUTE_FONT_SIZE))
-        return maxLen
+        return max(textWidth(self.name, TITLE_FONT_SIZE), max((row.width for row in self.rows), default=0)) + 2 * TEXT_PADDING
     
     def __calcHeight(self) -> int:
         height = getTextHeight(TITLE_FONT_SIZE)
         height += SEPARATOR_HEIGHT # separator
-        height += getTextHeight(ATTRIBUTE_FONT_SIZE) * (len(self.attributes) + len(self.properties) + len(self.methods))
+        height += getTextHeight(ATTRIBUTE_FONT_SIZE) * len(self.rows)
         height += SEPARATOR_HEIGHT # separator
         return height
         
-    @staticmethod
-    def fromDict(name : str, classDict : dict) -> 'Class':
-        return Class(name, classDict['attributes'], classDict['properties'], classDict['methods'], classDict['inheritFrom'], classDict['inheritedBy'], classDict['composition'], classDict['aggregation'])
+    def __getstate__(self) -> dict:
+        # a class sent to another process goes without its model
+        return {**self.__dict__, 'model': None}
     
     def getInheritanceLevel(self) -> int:
-        level = 0
-        for parent in self.inheritFrom:
-            level = max(level, Class.__instances[parent].getInheritanceLevel() + 1)
-        return level
+        return self.__diagram().hierarchy.level(self.index)
     
     def getInheritanceTreeSize(self) -> int:
-        return self.__reqGetInheritanceTreeSize() + 1 
+        return self.__diagram().hierarchy.treeSize(self.index)
     
-    def __reqGetInheritanceTreeSize(self) -> int:
-        size = 0
-        #count all parents
-        size += self.getInheritanceLevel() # number of parents (excluding itself)
-        
-        #count all children
-        for cls in Class.__instances.values():
-            if self.name in cls.inheritFrom:
-                size += cls.__reqGetInheritanceTreeSize()
-        return size
+    def getBestX(self) -> int:
+        return self.__diagram().getBestX(self.index)
     
-    def build(self, color : colour.Color) -> ETX.Element:   
-        G = super().build(color)
+    def __diagram(self) -> Any:
+        if self.model is None:
+            raise ValueError(f"Class {self.name} is not part of a diagram model")
+        return self.model
+    
+    @staticmethod
+    def fromDict(name : str, classDict : dict, limits : MemberLimits = NO_LIMITS) -> 'Class':
+        return Class(name, classDict['attributes'], classDict['properties'], classDict['methods'], classDict['inheritFrom'], classDict['inheritedBy'], classDict['composition'], classDict['aggregation'],
+                     classDict.get('dependencies'), limits)
+    
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:   
+        G = super().build(precision, lod)
              
         # group
         G.attrib["class"] = "class"
-        G.attrib['width'] = f"{self._width}"
-        G.attrib['height'] = f"{self._height}"
-        G.attrib['color'] = color.hex
-        G.attrib['transform'] = f"translate({self.x} {self.y})"
         
         # border
-        border = ET.Element("rect", None, None)
-        border.attrib["class"] = "border"
-        border.attrib["x"] = "0"
-        border.attrib["y"] = "0"
-        border.attrib["width"] = f"{self._width}"
-        border.attrib["height"] = f"{self._height}"
-        border.attrib['stroke-width'] = "1"
-        border.attrib['fill'] = "none"
-        border.attrib['stroke'] = "currentColor"
-        G.append(border) #type: ignore
+        G.append(Border(self._width, self._height))
         
         y = 0
         
         # class name
-        className = ET.Element("text", None, None)
-        className.text = self.name
-        className.attrib["class"] = "className"
-        className.attrib['transform'] = f"translate({self._width/2}, {ATTRIBUTE_FONT_SIZE + 5})"
-        className.attrib['text-anchor'] = "middle"
-        className.attrib['x'] = "0"
-        className.attrib['y'] = f"{y}"
-        className.attrib['fill'] = "currentColor"
-        className.attrib['stroke'] = "none"
-        className.attrib['font-size'] = f"{TITLE_FONT_SIZE}px"
-        
-        G.append(className) #type: ignore
+        G.append(Title(self.name, "className", self._width, y + ATTRIBUTE_FONT_SIZE + 5, precision))
         y += getTextHeight(TITLE_FONT_SIZE) + 5
         
         # separator
-        G.append(Separator(0, y, self._width, 'currentColor'))
+        G.append(Separator(0, y, self._width))
         y += SEPARATOR_HEIGHT
         
-        # attributes
-        for key, value in self.attributes.items():
-            attribute = ET.Element("text", None, None)
-            attribute.text = Attribute2Text(key, value)
-            attribute.attrib["class"] = "attribute"
-            attribute.attrib['transform'] = f"translate(5, {y})"
-            attribute.attrib['x'] = "0"
-            attribute.attrib['y'] = "0"
-            attribute.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-            attribute.attrib['fill'] = "currentColor"
-            attribute.attrib['stroke'] = "none"
-            G.append(attribute) #type: ignore
-            y += getTextHeight(ATTRIBUTE_FONT_SIZE)
-            
-        # properties
-        for key, value in self.properties.items():
-            _property = ET.Element("text", None, None)
-            _property.text = Attribute2Text(key, value)
-            _property.attrib["class"] = "property"
-            _property.attrib['transform'] = f"translate(5, {y})"
-            _property.attrib['x'] = "0"
-            _property.attrib['y'] = "0"
-            _property.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-            _property.attrib['fill'] = "currentColor"
-            _property.attrib['stroke'] = "none"
-            G.append(_property) #type: ignore
+        members = Members(G) if lod and self.rows else G
+        
+        # attributes and properties
+        for row in self.rows:
+            if row.kind == ROW_KIND.METHOD:
+                continue
+            members.append(row.build(y))
             y += getTextHeight(ATTRIBUTE_FONT_SIZE)
             
         # separator
-        G.append(Separator(0, y, self._width, 'currentColor'))
+        G.append(Separator(0, y, self._width))
         y += SEPARATOR_HEIGHT
         
         # methods
-        for key, value in self.methods.items():
-            method = ET.Element("text", None, None)
-            method.text = Method2Text(key, value)
-            method.attrib["class"] = "method"
-            method.attrib['transform'] = f"translate(5, {y})"
-            method.attrib['x'] = "0"
-            method.attrib['y'] = "0"
-            method.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-            method.attrib['fill'] = "currentColor"
-            method.attrib['stroke'] = "none"
-            G.append(method) #type: ignore
+        for row in self.rows:
+            if row.kind != ROW_KIND.METHOD:
+                continue
+            members.append(row.build(y))
             y += getTextHeight(ATTRIBUTE_FONT_SIZE)
         
         
         return G  
         
-    def getBestX(self) -> int:
-        if len(self.inheritFrom) == 0:
-            return -1
-        best = sum(Class.__instances[parent].S[0] for parent in self.inheritFrom) // len(self.inheritFrom)
-        return best - self._width // 2
-        
+class Stub(Class):
+    """A class of another page of a sharded diagram, drawn as a dashed box holding its name, linking to it"""
+    def __init__(self, name : str, href : str, inheritFrom : list, composition : list, aggregation : list):
+        super().__init__(name, {}, {}, {}, inheritFrom, [], composition, aggregation)
+        self.href = href
+    
+    @staticmethod
+    def fromDict(name : str, stubDict : dict) -> 'Stub':
+        return Stub(name, stubDict['href'], stubDict['inheritFrom'], stubDict['composition'], stubDict['aggregation'])
+    
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:
+        G = super().build(precision, lod)
+        G.attrib["class"] = "class stub"
+        G[0].attrib["class"] = "border dashed"
+        return Link(G, self.href)
+
+
+class Package(Class):
+    """A package of a sharded diagram, on the overview: its size and the relations it has with each other package, linking to its page"""
+    def __init__(self, name : str, href : str, classes : int, enums : int, dependencies : dict[str, int]):
+        self.href = href
+        self.counts = (classes, enums)
+        self.dependencyCounts = dependencies
+        super().__init__(name, {}, {}, {}, [], [], [], [], list(dependencies))
+    
+    def _calcRows(self) -> list[Row]:
+        classes, enums = self.counts
+        texts = [f"{classes} classes", f"{enums} enums", *(f"→ {package} : {count}" for package, count in self.dependencyCounts.items())]
+        return Row.measure(texts, [ROW_KIND.VALUE] * 2 + [ROW_KIND.METHOD] * len(self.dependencyCounts))
+    
+    @staticmethod
+    def fromDict(name : str, packageDict : dict) -> 'Package':
+        return Package(name, packageDict['href'], packageDict['classes'], packageDict['enums'], packageDict['dependencies'])
+    
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:
+        G = super().build(precision, lod)
+        G.attrib["class"] = "package"
+        return Link(G, self.href)
+
+
 class _Enum(Element):
-    def __init__(self, name : str, values : list, methods : dict):
+    def __init__(self, name : str, values : list, methods : dict, limits : MemberLimits = NO_LIMITS):
         super().__init__(name)
         self.values = values
         self.methods = methods
+        self.limits = limits
         
+        self.rows = self._calcRows() # values, then methods
         self._width = self.__calcWidth()
         self._height = self.__calcHeight()
+    
+    def _calcRows(self) -> list[Row]:
+        limits = self.limits
+        rows = limits.section([(value, ROW_KIND.VALUE) for value in self.values])
+        rows += limits.section([(Method2Text(key, data), ROW_KIND.METHOD) for key, data in limits.visible(self.methods)])
+        return Row.measure([text for text, _ in rows], [kind for _, kind in rows])
         
     def __calcWidth(self) -> int:
-        maxLen = getTextWidth(self.name, TITLE_FONT_SIZE)
-        maxLen = max(maxLen, getTextWidth("<<enumeration>>", ATTRIBUTE_FONT_SIZE))
-        for value in self.values:
-            maxLen = max(maxLen, getTextWidth(value, ATTRIBUTE_FONT_SIZE))
-        for key in self.methods:
-            maxLen = max(maxLen, getTextWidth(Method2Text(key, self.methods[key]), ATTRIBUTE_FONT_SIZE))
-        return maxLen
+        return max(textWidth(self.name, TITLE_FONT_SIZE), textWidth("<<enumeration>>", ATTRIBUTE_FONT_SIZE), max((row.width for row in self.rows), default=0)) + 2 * TEXT_PADDING
     
     def __calcHeight(self) -> int:
         height = getTextHeight(ATTRIBUTE_FONT_SIZE)
         height += getTextHeight(TITLE_FONT_SIZE)
         height += SEPARATOR_HEIGHT
-        height += getTextHeight(ATTRIBUTE_FONT_SIZE) * (len(self.values) + len(self.methods))
+        height += getTextHeight(ATTRIBUTE_FONT_SIZE) * len(self.rows)
         height += SEPARATOR_HEIGHT
         return height
     
     @staticmethod
-    def fromDict(name : str, enumDict : dict) -> '_Enum':
-        return _Enum(name, enumDict['values'], enumDict['methods'])
+    def fromDict(name : str, enumDict : dict, limits : MemberLimits = NO_LIMITS) -> '_Enum':
+        return _Enum(name, enumDict['values'], enumDict['methods'], limits)
     
-    def build(self, color : colour.Color) -> ETX.Element:
-        G = super().build(color)
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:
+        G = super().build(precision, lod)
     
         # group
         G.attrib["class"] = "enum"
-        G.attrib['width'] = f"{self._width}"
-        G.attrib['height'] = f"{self._height}"
-        G.attrib['color'] = color.hex
-        G.attrib['transform'] = f"translate({self.x} {self.y})"
         
         # border
-        border = ET.Element("rect", None, None)
-        border.attrib["class"] = "border"
-        border.attrib["x"] = "0"
-        border.attrib["y"] = "0"
-        border.attrib["width"] = f"{self._width}"
-        border.attrib["height"] = f"{self._height}"
-        border.attrib['stroke-width'] = "1"
-        border.attrib['fill'] = "none"
-        border.attrib['stroke'] = "currentColor"
-        G.append(border) #type: ignore
+        G.append(Border(self._width, self._height))
         
         y = 0
         
         # <<enumeration>>
-        enumSurTitle = ET.Element("text", None, None)
-        enumSurTitle.text = "<<enumeration>>"
-        enumSurTitle.attrib["class"] = "enumSurTitle"
-        enumSurTitle.attrib['transform'] = f"translate({self._width/2}, {ATTRIBUTE_FONT_SIZE + 5})"
-        enumSurTitle.attrib['text-anchor'] = "middle"
-        enumSurTitle.attrib['x'] = "0"
-        enumSurTitle.attrib['y'] = f"{y}"
-        enumSurTitle.attrib['fill'] = "currentColor"
-        enumSurTitle.attrib['stroke'] = "none"
-        enumSurTitle.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-        enumSurTitle.attrib['font-style'] = "italic"
-        
-        G.append(enumSurTitle) #type: ignore
+        G.append(Title("<<enumeration>>", "enumSurTitle", self._width, y + ATTRIBUTE_FONT_SIZE + 5, precision))
         y += getTextHeight(ATTRIBUTE_FONT_SIZE) + 5
         
         # name
-        enumName = ET.Element("text", None, None)
-        enumName.text = self.name
-        enumName.attrib["class"] = "enumName"
-        enumName.attrib['transform'] = f"translate({self._width/2}, {ATTRIBUTE_FONT_SIZE + 5})"
-        enumName.attrib['text-anchor'] = "middle"
-        enumName.attrib['x'] = "0"
-        enumName.attrib['y'] = f"{y}"
-        enumName.attrib['fill'] = "currentColor"
-        enumName.attrib['stroke'] = "none"
-        enumName.attrib['font-size'] = f"{TITLE_FONT_SIZE}px"
-        
-        G.append(enumName) #type: ignore
+        G.append(Title(self.name, "enumName", self._width, y + ATTRIBUTE_FONT_SIZE + 5, precision))
         y += getTextHeight(TITLE_FONT_SIZE) + 5
         
         # separator
-        G.append(Separator(0, y, self._width, 'currentColor'))
+        G.append(Separator(0, y, self._width))
         y += SEPARATOR_HEIGHT
         
+        members = Members(G) if lod and self.rows else G
+        
         # values
-        for value in self.values:
-            valueElement = ET.Element("text", None, None)
-            valueElement.text = value
-            valueElement.attrib["class"] = "value"
-            valueElement.attrib['transform'] = f"translate(5, {y})"
-            valueElement.attrib['x'] = "0"
-            valueElement.attrib['y'] = "0"
-            valueElement.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-            valueElement.attrib['fill'] = "currentColor"
-            valueElement.attrib['stroke'] = "none"
-            G.append(valueElement) #type: ignore
+        for row in self.rows:
+            if row.kind != ROW_KIND.VALUE:
+                continue
+            members.append(row.build(y))
             y += getTextHeight(ATTRIBUTE_FONT_SIZE)
             
         # separator
-        G.append(Separator(0, y, self._width, 'currentColor'))
+        G.append(Separator(0, y, self._width))
         y += SEPARATOR_HEIGHT
         
         # methods
-        for key, value in self.methods.items():
-            method = ET.Element("text", None, None)
-            method.text = Method2Text(key, value)
-            method.attrib["class"] = "method"
-            method.attrib['transform'] = f"translate(5, {y})"
-            method.attrib['x'] = "0"
-            method.attrib['y'] = "0"
-            method.attrib['font-size'] = f"{ATTRIBUTE_FONT_SIZE}px"
-            method.attrib['fill'] = "currentColor"
-            method.attrib['stroke'] = "none"
-            G.append(method) #type: ignore
+        for row in self.rows:
+            if row.kind != ROW_KIND.METHOD:
+                continue
+            members.append(row.build(y))
             y += getTextHeight(ATTRIBUTE_FONT_SIZE)
             
         return G
@@ -459,74 +550,82 @@ class ARROW_TYPE(Enum):
     OPEN_TRIANGLE = 3
     
 
-def Arrow(position : tuple[int, int], angle : float, arrowType : ARROW_TYPE, filled : bool):
+def markerId(arrowType : ARROW_TYPE, filled : bool) -> str:
+    return f"{'filled-' if filled else ''}{arrowType.name.lower().replace('_', '-')}"
+
+
+def Marker(arrowType : ARROW_TYPE, filled : bool) -> ETX.Element:
+    """Arrowhead drawn at the end of a line, its tip on the end point and pointing along the line.
+
+    Markers live in the <defs> of the diagram (see `Markers`) and are referenced by id.
+    """
     match arrowType:
         case ARROW_TYPE.DIAMOND:
             arrow = ET.Element("polygon", None, None)
-            arrow.attrib["points"] = f"{position[0]-5},{position[1]-5} {position[0]+5},{position[1]} {position[0]-5},{position[1]+5} {position[0]-15},{position[1]}"
-            arrow.attrib["fill"] = "currentColor" if filled else "none"
+            arrow.attrib["points"] = "-10,-5 0,0 -10,5 -20,0"
+            viewBox = "-21 -6 22 12"
         case ARROW_TYPE.TRIANGLE:
             arrow = ET.Element("polygon", None, None)
-            arrow.attrib["points"] = f"{position[0]-5},{position[1]-5} {position[0]+5},{position[1]} {position[0]-5},{position[1]+5}"
-            arrow.attrib["fill"] = "currentColor" if filled else "none"
+            arrow.attrib["points"] = "-10,-5 0,0 -10,5"
+            viewBox = "-11 -6 12 12"
         case ARROW_TYPE.OPEN_TRIANGLE:
             arrow = ET.Element("polyline", None, None)
-            arrow.attrib["points"] = f"{position[0]-5},{position[1]-5} {position[0]+5},{position[1]} {position[0]-5},{position[1]+5}"
-            arrow.attrib["fill"] = "none"
+            arrow.attrib["points"] = "-10,-5 0,0 -10,5"
+            viewBox = "-11 -6 12 12"
             if filled:
                 raise ValueError("Open triangle can't be filled")
         case _:
             raise ValueError("Invalid arrow type")
-    
-    arrow.attrib["stroke"] = "currentColor"
-    arrow.attrib["stroke-width"] = "1"
-    arrow.attrib["transform"] = f"rotate({angle} {position[0]} {position[1]}) translate(-5)"
-    
-    return arrow
+    if filled:
+        arrow.attrib["class"] = "filled"
+    
+    marker = ET.Element("marker", None, None)
+    marker.attrib["id"] = markerId(arrowType, filled)
+    marker.attrib["viewBox"] = viewBox
+    marker.attrib["markerWidth"] = viewBox.split()[2]
+    marker.attrib["markerHeight"] = viewBox.split()[3]
+    marker.attrib["markerUnits"] = "userSpaceOnUse"
+    marker.attrib["orient"] = "auto"
+    marker.append(arrow)
+    
+    return marker #type: ignore
+
+
+def Markers() -> ETX.Element:
+    """<defs> holding the marker of every arrowhead used by the relations"""
+    defs = ET.Element("defs", None, None)
+    for arrowType, filled in ((ARROW_TYPE.OPEN_TRIANGLE, False), (ARROW_TYPE.DIAMOND, False), (ARROW_TYPE.DIAMOND, True), (ARROW_TYPE.TRIANGLE, True)):
+        defs.append(Marker(arrowType, filled))
+    return defs #type: ignore
     
 
 class LINE_TYPE(Enum):
     SOLID = 0
     DASHED = 1
     
-def Line(start : tuple[int, int], end : tuple[int, int], lineType : LINE_TYPE):
-    line = ET.Element("line", None, None)
-    line.attrib["x1"] = f"{start[0]}"
-    line.attrib["y1"] = f"{start[1]}"
-    line.attrib["x2"] = f"{end[0]}"
-    line.attrib["y2"] = f"{end[1]}"
-    line.attrib["stroke"] = "currentColor"
-    line.attrib["stroke-width"] = "1"
-    
-    match lineType:
-        case LINE_TYPE.SOLID:
-            pass
-        case LINE_TYPE.DASHED:
-            line.attrib["stroke-dasharray"] = "5,5"
-        case _:
-            raise ValueError("Invalid line type")
-    
-    return line
+def PathData(points : list[tuple[int, int]], precision : int | None = None) -> str:
+    """M/L path data through the points, consecutive duplicates skipped"""
+    d = [f"M{Number(points[0][0], precision)} {Number(points[0][1], precision)}"]
+    for previous, point in zip(points, points[1:]):
+        if point != previous:
+            d.append(f"L{Number(point[0], precision)} {Number(point[1], precision)}")
+    return " ".join(d)
 
 
-def GeomLine(start : tuple[int, int], end : tuple[int, int], lineType : LINE_TYPE):
-    G = ET.Element("g", None, None)
-    G.attrib["class"] = "line"
-    
-    if start[0] == end[0]:
-        G.append(Line(start, end, lineType))
-        return G
-    
-    p0 = start
-    p1 = (start[0], (start[1]+end[1])//2)
-    p2 = (end[0], (start[1]+end[1])//2)
-    p3 = end
+def Path(points : list[tuple[int, int]], precision : int | None = None):
+    """one <path> through the points, consecutive duplicates skipped"""
+    path = ET.Element("path", None, None)
+    path.attrib["d"] = PathData(points, precision)
     
-    G.append(Line(p0, p1, lineType))
-    G.append(Line(p1, p2, lineType))
-    G.append(Line(p2, p3, lineType))
+    return path
 
-    return G
+
+def GeomPoints(start : tuple[int, int], end : tuple[int, int]) -> list[tuple[int, int]]:
+    """points of an elbow line: straight if vertical, otherwise vertical-horizontal-vertical"""
+    if start[0] == end[0]:
+        return [start, end]
+    middle = (start[1]+end[1])//2
+    return [start, (start[0], middle), (end[0], middle), end]
 
     
 class Relation:
@@ -541,82 +640,58 @@ class Relation:
         self.source = source
         self.target = target
         self.relationType = relationType
+        self.route = None # type: list[tuple[int, int]]|None # from the end of the start step to the start of the arrow step, elbow line if None
+        self.anchorPoints = None # type: tuple|None # as returned by `anchors`, set for all relations at once by SVG.placeRelations
         
-    def build(self, color : colour.Color) -> ETX.Element:
-        G = ET.Element("g", None, None)
-        G.attrib["class"] = "relation"
-        G.attrib["color"] = color.hex
-        
+    def anchors(self) -> tuple[tuple[int, int], tuple[int, int], tuple[int, int], tuple[int, int]]:
+        """return the start point, the end of the start step, the start of the arrow step and the end point"""
+        if self.anchorPoints is not None:
+            return self.anchorPoints
         startPoint, startSide = self.source.getNearSide(*self.target.center)
         endPoint, endSide = self.target.getNearSide(*self.source.center)
+        (sx, sy), (ex, ey) = STEP_DIRECTIONS[startSide.value], STEP_DIRECTIONS[endSide.value]
+        startPointStep = (startPoint[0] + STEP * sx, startPoint[1] + STEP * sy)
+        arrowEndPoint = (endPoint[0] + STEP * ex, endPoint[1] + STEP * ey)
+        return startPoint, startPointStep, arrowEndPoint, endPoint
     
-        angle = 0
-        arrowEndPoint = [*endPoint]
-        match endSide:
-            case SIDE.N:
-                angle = 90
-                arrowEndPoint[1] -= 50
-            case SIDE.S:
-                angle = -90
-                arrowEndPoint[1] += 50
-            case SIDE.W:
-                angle = 0
-                arrowEndPoint[0] -= 50
-            case SIDE.E:
-                angle = 180
-                arrowEndPoint[0] += 50
-            case _:
-                raise ValueError("Invalid side")
-        
-        arrowEndPoint = tuple(arrowEndPoint)
-        
-        startPointStep = [*startPoint]
-        match startSide:
-            case SIDE.N: startPointStep[1] -= 50
-            case SIDE.S: startPointStep[1] += 50
-            case SIDE.W: startPointStep[0] -= 50
-            case SIDE.E: startPointStep[0] += 50
-            case _: raise ValueError("Invalid side")
+    def segments(self) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+        """segments of the line drawn by `build`, from the source to the target"""
+        points = self.points()
+        return list(zip(points, points[1:]))
+    
+    def __middle(self, startPointStep : tuple[int, int], arrowEndPoint : tuple[int, int]) -> list[tuple[int, int]]:
+        return self.route if self.route is not None else GeomPoints(startPointStep, arrowEndPoint)
         
+    def appearance(self) -> tuple[LINE_TYPE, str]:
+        """type of the line and id of the arrowhead marker of the relation"""
         match self.relationType:
             case Relation.TYPE.ASSOCIATION: # Solid line, open triangle
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.SOLID))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.SOLID))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.SOLID))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.OPEN_TRIANGLE, False))
-                
+                return LINE_TYPE.SOLID, markerId(ARROW_TYPE.OPEN_TRIANGLE, False)
             case Relation.TYPE.AGGREGATION: # Solid line, empty diamond
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.SOLID))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.SOLID))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.SOLID))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.DIAMOND, False))
-                
+                return LINE_TYPE.SOLID, markerId(ARROW_TYPE.DIAMOND, False)
             case Relation.TYPE.COMPOSITION: # Solid line, filled diamond
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.SOLID))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.SOLID))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.SOLID))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.DIAMOND, True))
-                
+                return LINE_TYPE.SOLID, markerId(ARROW_TYPE.DIAMOND, True)
             case Relation.TYPE.INHERITANCE: # Solid line, filled triangle
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.SOLID))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.SOLID))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.SOLID))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.TRIANGLE, True))
-                
+                return LINE_TYPE.SOLID, markerId(ARROW_TYPE.TRIANGLE, True)
             case Relation.TYPE.IMPLEMENTATION: # Dashed line, filled triangle
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.DASHED))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.DASHED))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.DASHED))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.TRIANGLE, True))
-                
+                return LINE_TYPE.DASHED, markerId(ARROW_TYPE.TRIANGLE, True)
             case Relation.TYPE.DEPENDENCY: # Dashed line, open triangle
-                G.append(Line(arrowEndPoint, endPoint, LINE_TYPE.DASHED))
-                G.append(GeomLine(startPointStep, arrowEndPoint, LINE_TYPE.DASHED))
-                G.append(Line(startPoint, startPointStep, LINE_TYPE.DASHED))
-                G.append(Arrow(endPoint, angle, ARROW_TYPE.OPEN_TRIANGLE, False))
-                
+                return LINE_TYPE.DASHED, markerId(ARROW_TYPE.OPEN_TRIANGLE, False)
             case _:
                 raise ValueError("Invalid relation type")
+    
+    def points(self) -> list[tuple[int, int]]:
+        """points of the line drawn by `build`, from the source to the target"""
+        startPoint, startPointStep, arrowEndPoint, endPoint = self.anchors()
+        return [startPoint, *self.__middle(startPointStep, arrowEndPoint), endPoint]
+        
+    def build(self, precision : int | None = None, lod : bool = False) -> ETX.Element:
+        """the relation as one path; relations are drawn at every level of detail"""
+        lineType, arrow = self.appearance()
+        
+        path = Path(self.points(), precision)
+        path.attrib["class"] = "relation dashed" if lineType == LINE_TYPE.DASHED else "relation"
+        path.attrib["marker-end"] = f"url(#{arrow})"
 
-        return G #type: ignore
+        return path #type: ignore
 
@@ -0,0 +1,49 @@
+import numpy as np
+
+STEP = 50 # length of the straight steps at both ends of a relation
+
+# sides in the order of customTypes.SIDE: N, S, W, E
+STEP_DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+def sidePoints(boxes : np.ndarray) -> np.ndarray:
+    """middle of the sides of the boxes (x, y, width, height); shape (n, 4, 2), sides ordered N, S, W, E"""
+    x, y, w, h = boxes.T
+    cx, cy = x + w // 2, y + h // 2
+    return np.stack([
+        np.stack([cx, y], axis=1),
+        np.stack([cx, y + h], axis=1),
+        np.stack([x, cy], axis=1),
+        np.stack([x + w, cy], axis=1)
+    ], axis=1)
+
+
+def nearSides(boxes : np.ndarray, points : np.ndarray) -> np.ndarray:
+    """index of the side of each box whose middle is the nearest to the matching point; ties go to the first side"""
+    sides = sidePoints(boxes)
+    distances = ((sides - points[:, None, :]) ** 2).sum(axis=2)
+    return distances.argmin(axis=1)
+
+
+def relationAnchors(boxes : np.ndarray, sources : np.ndarray, targets : np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Anchors of every relation between the boxes, in one pass.
+
+    `boxes` is an integer array of (x, y, width, height); relation k goes from box `sources[k]`
+    to box `targets[k]`, from the side of the source nearest to the center of the target and
+    the other way around. Return the start points, the ends of the start steps, the starts of
+    the arrow steps and the end points, each of shape (m, 2).
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    centers = boxes[:, :2] + boxes[:, 2:] // 2
+    sourceBoxes, targetBoxes = boxes[sources], boxes[targets]
+
+    startSides = nearSides(sourceBoxes, centers[targets])
+    endSides = nearSides(targetBoxes, centers[sources])
+    rows = np.arange(len(sources))
+    startPoints = sidePoints(sourceBoxes)[rows, startSides]
+    endPoints = sidePoints(targetBoxes)[rows, endSides]
+
+    directions = np.array(STEP_DIRECTIONS, dtype=np.int64)
+    startSteps = startPoints + STEP * directions[startSides]
+    arrowSteps = endPoints + STEP * directions[endSides]
+    return startPoints, startSteps, arrowSteps, endPoints
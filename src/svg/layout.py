@@ -0,0 +1,534 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+import networkx as nx
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+try:
+    from .packing import packRectangles
+    from .metrics import countCrossings, expandRanges
+except ImportError:
+    from packing import packRectangles
+    from metrics import countCrossings, expandRanges
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Layout")
+
+
+FORCE_ITERATIONS = 150
+FORCE_APPROXIMATION_THRESHOLD = 400 # above this number of vertices, far away vertices are grouped in grid buckets
+FORCE_GRAVITY = 0.5
+FORCE_DISTANCE_SCALE = 0.5 # ideal distance between two vertices, relative to the mean diagonal of the boxes
+FORCE_SEPARATION_PHASE = 0.3 # fraction of the iterations during which overlapping boxes repel each other
+OVERLAP_PASSES = 200
+PARALLEL_THRESHOLD = 200 # components with at least this number of vertices are laid out in a worker pool
+ATTEMPT_THRESHOLD = 3 # components with fewer vertices than this are laid out once, whatever the number of attempts
+CROSSING_WEIGHT = 10 # cost of an edge crossing, in mean box diagonals of edge length
+GRID_MAX_COST = 50**3 # largest cost matrix (vertices x grid cells) the automatic choice solves exactly
+GRID_SECONDS_SCALE = 1e-9 # measured time to fill and solve the cost matrix of n vertices, over n⁴ (0.1s for 100 vertices, 3.8s for 250)
+LAYERED_MIN_SHARE = 0.6 # share of edges linking consecutive levels above which a component is drawn in layers
+LAYERED_MAX_ASPECT = 3 # width over height of the layered placement above which it is not chosen automatically
+LAYERED_SWEEPS = 8
+FALLBACK = "packing" # method of the components placed by fallbackLayout
+CUT_SHORT = ", cut short" # suffix of the methods stopped by the time budget
+
+
+class LAYOUT(Enum):
+    GRID = "grid"
+    FORCE = "force"
+    LAYERED = "layered"
+    AUTO = "auto"
+
+    def __str__(self):
+        return self.value
+
+
+
+def layoutGraph(G : nx.Graph, vertex_sizes : dict, margin : int, layout : LAYOUT, deadline : float | None = None, seed : int | None = None,
+                 vertex_levels : dict | None = None) -> tuple[dict, str]:
+    """Place the vertices of `G` with the given backend; LAYOUT.AUTO picks one with `chooseLayout`.
+
+    `deadline` is a `time.time()` value; a backend still running at that time returns the best
+    placement it has so far, and a component reached after it is packed instead of laid out.
+    With a `seed`, the vertex order (grid, layered) or the initial positions (force) are randomized.
+    `vertex_levels` gives the inheritance level of each vertex, used by the layered layout.
+    Return the top-left corner of each vertex, and the name of the method that placed them.
+    """
+    if layout == LAYOUT.AUTO:
+        layout, reason = chooseLayout(G, vertex_sizes, margin, vertex_levels)
+        if layout == LAYOUT.GRID:
+            Logger.debug(f"Component of {reason}")
+        else:
+            Logger.info(f"Component of {reason}")
+    if len(G) == 1:
+        return {v: (margin, margin) for v in G.nodes}, str(layout)
+    if _expired(deadline):
+        return fallbackLayout(G, vertex_sizes, margin), FALLBACK
+    match layout:
+        case LAYOUT.GRID:
+            if seed is not None:
+                vertex_list = list(G.nodes)
+                np.random.default_rng(seed).shuffle(vertex_list)
+                shuffled = nx.Graph()
+                shuffled.add_nodes_from(vertex_list)
+                shuffled.add_edges_from(G.edges)
+                G = shuffled
+            # the n x n² cost matrix is only allocated if the time budget can cover solving it
+            seconds = gridSeconds(len(G))
+            if deadline is not None and time.time() + seconds > deadline:
+                Logger.debug(f"The time budget cannot cover the grid assignment of {len(G)} vertices (about {seconds:.1f}s)")
+                return fallbackLayout(G, vertex_sizes, margin), FALLBACK
+            x_spacing = max(vertex_sizes[v][0] for v in G.nodes) + margin
+            y_spacing = max(vertex_sizes[v][1] for v in G.nodes) + margin
+            x, y = np.meshgrid(np.arange(len(G)) * x_spacing, np.arange(len(G)) * y_spacing, indexing='ij')
+            grid = np.stack((x.ravel(), y.ravel()), axis=1)
+            placement = assignToGrid(G, grid, vertex_sizes, margin, deadline)
+            if placement is None:
+                return fallbackLayout(G, vertex_sizes, margin), FALLBACK
+            return placement, str(layout)
+        case LAYOUT.FORCE:
+            placement = forceLayout(G, vertex_sizes, margin, seed=seed or 0, deadline=deadline)
+            return placement, str(layout) + CUT_SHORT if _expired(deadline) else str(layout)
+        case LAYOUT.LAYERED:
+            placement = layeredLayout(G, vertex_sizes, margin, vertex_levels, seed=seed, deadline=deadline)
+            return placement, str(layout) + CUT_SHORT if _expired(deadline) else str(layout)
+        case _:
+            raise ValueError(f"Invalid layout {layout}")
+
+
+def chooseLayout(G : nx.Graph, vertex_sizes : dict, margin : int, vertex_levels : dict | None = None) -> tuple[LAYOUT, str]:
+    """Pick a backend for `G` from an estimate of its cost, and tell why.
+
+    The grid assignment builds a cost matrix of n vertices by n² cells and solves it in about
+    n⁴ time, see `gridSeconds`, so it is only used up to GRID_MAX_COST entries. Bigger components are drawn in
+    layers when most of their edges link consecutive inheritance levels and the layered placement,
+    margins and centering included, is at most LAYERED_MAX_ASPECT times wider than high; with the
+    force layout otherwise. The layered placement is cheap next to the force layout, so it is
+    measured rather than estimated.
+    """
+    n = len(G)
+    edges = G.number_of_edges()
+    cost = n ** 3
+    if cost <= GRID_MAX_COST:
+        return LAYOUT.GRID, f"{n} vertices: exact grid assignment ({cost} cost-matrix entries)"
+    reason = f"{n} vertices and {edges} edges: the grid assignment would need a {n}x{n * n} cost matrix " \
+             f"(at least {cost * 8 / 2**20:.0f} MiB, about {gridSeconds(n):.0f}s)"
+    if vertex_levels is not None and edges:
+        layered = sum(1 for u, v in G.edges if abs(vertex_levels[u] - vertex_levels[v]) == 1)
+        if layered >= LAYERED_MIN_SHARE * edges:
+            width, height = _extent(layeredLayout(G, vertex_sizes, margin, vertex_levels), vertex_sizes, margin)
+            aspect = width / height
+            if aspect <= LAYERED_MAX_ASPECT:
+                return LAYOUT.LAYERED, f"{reason}; {layered} edges link consecutive levels, using the layered layout ({aspect:.1f}:1)"
+            reason += f"; {layered} edges link consecutive levels but the layers would be {aspect:.1f} times wider than high"
+    return LAYOUT.FORCE, f"{reason}; using the force layout"
+
+
+def _extent(placement : dict, vertex_sizes : dict, margin : int) -> tuple[int, int]:
+    """width and height of a placement, with a margin on every side"""
+    width = max(x + vertex_sizes[v][0] for v, (x, _) in placement.items()) + margin
+    height = max(y + vertex_sizes[v][1] for v, (_, y) in placement.items()) + margin
+    return width, height
+
+
+def gridSeconds(n : int) -> float:
+    """estimated time to build and solve the cost matrix of the grid assignment of n vertices"""
+    return n ** 4 * GRID_SECONDS_SCALE
+
+
+def isFallback(method : str) -> bool:
+    """whether a method returned by layoutGraph means the time budget degraded the placement"""
+    return method == FALLBACK or method.endswith(CUT_SHORT)
+
+
+def layoutComponents(components : list[nx.Graph], vertex_sizes : dict, margin : int, layout : LAYOUT, deadline : float | None = None,
+                      attempts : int = 1, seed : int | None = None, vertex_levels : dict | None = None) -> list[tuple[dict, str]]:
+    """Lay out each connected component on its own.
+
+    When several components are big enough, they are spread over a process pool.
+    With more than one attempt, every component is laid out `attempts` times from the seeds
+    `seed`, `seed + 1`, ... in a process pool, and the attempt with the best `scorePlacement` is kept.
+    Return one placement per component, in the same order, with the method used for it.
+    """
+    if attempts > 1:
+        return _bestOfAttempts(components, vertex_sizes, margin, layout, deadline, attempts, seed or 0, vertex_levels)
+    big = [i for i, component in enumerate(components) if len(component) >= PARALLEL_THRESHOLD]
+    placements = [None] * len(components) # type: list[tuple[dict, str]|None]
+    if len(big) > 1:
+        Logger.debug(f"Laying out {len(big)} components in parallel")
+        with ProcessPoolExecutor(max_workers=min(len(big), os.cpu_count() or 1)) as pool:
+            futures = {
+                i: pool.submit(layoutGraph, components[i], {v: vertex_sizes[v] for v in components[i]}, margin, layout, deadline, seed, _restrict(vertex_levels, components[i]))
+                for i in big
+            }
+            for i, future in futures.items():
+                placements[i] = future.result()
+    for i, component in enumerate(components):
+        if placements[i] is None:
+            placements[i] = layoutGraph(component, vertex_sizes, margin, layout, deadline, seed, vertex_levels)
+    return placements #type: ignore
+
+
+def _restrict(values : dict | None, G : nx.Graph) -> dict | None:
+    """the part of a per-vertex dictionary a worker needs for `G`"""
+    return None if values is None else {v: values[v] for v in G}
+
+
+def _bestOfAttempts(components : list[nx.Graph], vertex_sizes : dict, margin : int, layout : LAYOUT, deadline : float | None, attempts : int, seed : int,
+                    vertex_levels : dict | None) -> list[tuple[dict, str]]:
+    placements = [None] * len(components) # type: list[tuple[dict, str]|None]
+    tasks = [] # form of (component index, seed)
+    for i, component in enumerate(components):
+        if len(component) < ATTEMPT_THRESHOLD:
+            placements[i] = layoutGraph(component, vertex_sizes, margin, layout, deadline, None, vertex_levels)
+        else:
+            tasks += [(i, seed + attempt) for attempt in range(attempts)]
+    if not tasks:
+        return placements #type: ignore
+
+    Logger.debug(f"Running {attempts} layout attempts for {len(tasks) // attempts} components")
+    best = {} # type: dict[int, tuple[float, int, dict, str]]
+    with ProcessPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as pool:
+        futures = [
+            (i, attemptSeed, pool.submit(_scoredAttempt, components[i], {v: vertex_sizes[v] for v in components[i]}, margin, layout, deadline, attemptSeed,
+                                         _restrict(vertex_levels, components[i])))
+            for i, attemptSeed in tasks
+        ]
+        for i, attemptSeed, future in futures:
+            score, placement, method = future.result()
+            # ties go to the lowest seed, whatever the order the attempts finish in
+            if i not in best or (score, attemptSeed) < best[i][:2]:
+                best[i] = (score, attemptSeed, placement, method)
+    for i, (score, attemptSeed, placement, method) in best.items():
+        Logger.debug(f"Component {i} ({len(components[i])} vertices): seed {attemptSeed} kept, score {score:.1f}")
+        placements[i] = (placement, method)
+    return placements #type: ignore
+
+
+def _scoredAttempt(G : nx.Graph, vertex_sizes : dict, margin : int, layout : LAYOUT, deadline : float | None, seed : int,
+                   vertex_levels : dict | None) -> tuple[float, dict, str]:
+    placement, method = layoutGraph(G, vertex_sizes, margin, layout, deadline, seed, vertex_levels)
+    return scorePlacement(G, placement, vertex_sizes, margin), placement, method
+
+
+def scorePlacement(G : nx.Graph, placement : dict, vertex_sizes : dict, margin : int) -> float:
+    """Cost of a placement, lower is better.
+
+    Edges are taken as straight lines between box centers. The cost is CROSSING_WEIGHT per
+    edge crossing, plus the total edge length and the bounding area, both measured with the
+    mean box diagonal (margin included) as unit length.
+    """
+    vertex_list = list(placement)
+    index = {v: i for i, v in enumerate(vertex_list)}
+    corners = np.array([placement[v] for v in vertex_list], dtype=float)
+    sizes = np.array([vertex_sizes[v] for v in vertex_list], dtype=float)
+    centers = corners + sizes / 2
+    unit = float(np.mean(np.hypot(sizes[:, 0] + margin, sizes[:, 1] + margin)))
+
+    edges = np.array([(index[u], index[v]) for u, v in G.edges if u != v], dtype=np.int64).reshape(-1, 2)
+    segments = np.hstack([centers[edges[:, 0]], centers[edges[:, 1]]])
+    crossings = countCrossings(segments)
+    length = float(np.sum(np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])))
+    extent = (corners + sizes).max(axis=0) - corners.min(axis=0)
+    return CROSSING_WEIGHT * crossings + length / unit + float(extent[0] * extent[1]) / unit**2
+
+
+def fallbackLayout(G : nx.Graph, vertex_sizes : dict, margin : int) -> dict:
+    """cheap deterministic placement: the vertices, sorted, packed in a near-square area"""
+    vertex_list = sorted(G.nodes)
+    positions = packRectangles([vertex_sizes[v] for v in vertex_list], margin)
+    return dict(zip(vertex_list, positions))
+
+
+def layeredLayout(G : nx.Graph, vertex_sizes : dict, margin : int, vertex_levels : dict | None = None, sweeps : int = LAYERED_SWEEPS,
+                   seed : int | None = None, deadline : float | None = None) -> dict:
+    """Place the vertices of `G` in rows, one row per level, the lowest level on top.
+
+    Levels default to the distance to the first vertex. The vertices of each row are ordered
+    by the mean rank of their neighbours in the row above, then in the row below, alternately
+    for `sweeps` sweeps (or until `deadline`), to reduce crossings. Each vertex is then centered
+    under its neighbours in the rows above, when the previous vertex of its row leaves room.
+    Return the top-left corner of each vertex.
+    """
+    if len(G) == 0:
+        return {}
+    if vertex_levels is None:
+        vertex_levels = nx.single_source_shortest_path_length(G, min(G.nodes))
+    levels = sorted({vertex_levels[v] for v in G})
+    rowIndex = {level: r for r, level in enumerate(levels)}
+    rows = [[] for _ in levels] # type: list[list]
+    for v in G.nodes:
+        rows[rowIndex[vertex_levels[v]]].append(v)
+    if seed is not None:
+        rng = np.random.default_rng(seed)
+        for row in rows:
+            rng.shuffle(row)
+    rowOf = {v: r for r, row in enumerate(rows) for v in row}
+    rank = {v: i / len(row) for row in rows for i, v in enumerate(row)}
+
+    for sweep in range(sweeps):
+        if _expired(deadline):
+            Logger.debug(f"Time budget spent after {sweep} of {sweeps} sweeps")
+            break
+        down = sweep % 2 == 0
+        for r in (range(1, len(rows)) if down else range(len(rows) - 2, -1, -1)):
+            adjacent = r - 1 if down else r + 1
+            def barycenter(v):
+                ranks = [rank[n] for n in G[v] if rowOf[n] == adjacent]
+                return sum(ranks) / len(ranks) if ranks else rank[v]
+            rows[r].sort(key=barycenter)
+            rank.update((v, i / len(rows[r])) for i, v in enumerate(rows[r]))
+
+    placement = {}
+    centers = {} # x coordinate of the center of the placed vertices
+    y = margin
+    for r, row in enumerate(rows):
+        cursor = margin
+        for v in row:
+            width = vertex_sizes[v][0]
+            above = [centers[n] for n in G[v] if rowOf[n] < r]
+            x = max(sum(above) / len(above) - width / 2, cursor) if above else cursor
+            placement[v] = (int(round(x)), y)
+            centers[v] = x + width / 2
+            cursor = x + width + margin
+        y += max(vertex_sizes[v][1] for v in row) + margin
+    return placement
+
+
+def _expired(deadline : float | None) -> bool:
+    return deadline is not None and time.time() >= deadline
+
+
+def assignToGrid(G : nx.Graph, grid : np.ndarray, vertex_sizes, margin, deadline : float | None = None):
+    # Calculate the cost matrix based on distances between vertices and grid points (rows of `grid`)
+    vertex_list = list(G.nodes)
+    # Add a cost proportional to the sum of vertex sizes (to maintain spacing)
+    size_with_margin = np.array([sum(dim + margin for dim in vertex_sizes[v]) for v in vertex_list], dtype=float)
+    distances = np.sqrt((grid * grid).sum(axis=1, dtype=float))
+    cost_matrix = size_with_margin[:, None] + distances[None, :]
+    if _expired(deadline):
+        Logger.debug(f"Time budget spent while building the cost matrix of {len(G)} vertices")
+        return None
+
+    # Solve assignment problem to minimize total cost
+    row_ind, col_ind = linear_sum_assignment(cost_matrix)
+    assigned_positions = {}
+    for i, j in zip(row_ind, col_ind):
+        assigned_positions[vertex_list[i]] = (int(grid[j, 0]) + margin, int(grid[j, 1]) + margin)
+        Logger.debug(f"Assigned {vertex_list[i]} to {assigned_positions[vertex_list[i]]}")
+
+    return assigned_positions
+
+
+def forceLayout(G : nx.Graph, vertex_sizes : dict, margin : int, iterations : int = FORCE_ITERATIONS, seed : int = 0, deadline : float | None = None) -> dict:
+    """Fruchterman-Reingold layout of `G`, with every force computed on NumPy arrays.
+
+    Repulsion is exact up to FORCE_APPROXIMATION_THRESHOLD vertices, and approximated with
+    grid buckets above it. The run lasts `iterations` steps, or stops at `deadline`, then
+    overlapping boxes are pushed apart. Return the top-left corner of each vertex.
+    """
+    vertex_list = list(G.nodes)
+    n = len(vertex_list)
+    if n == 0:
+        return {}
+    index = {v: i for i, v in enumerate(vertex_list)}
+    sizes = np.array([vertex_sizes[v] for v in vertex_list], dtype=float) + margin
+    edges = np.array([(index[u], index[v]) for u, v in G.edges if u != v], dtype=np.int64).reshape(-1, 2)
+
+    k = FORCE_DISTANCE_SCALE * float(np.mean(np.hypot(sizes[:, 0] - margin, sizes[:, 1] - margin))) # ideal distance between two vertices
+    side = k * math.sqrt(n)
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, side, (n, 2))
+
+    temperature = side / 10
+    cooling = temperature / (iterations + 1)
+    for step in range(iterations):
+        if _expired(deadline):
+            Logger.debug(f"Time budget spent after {step} of {iterations} iterations")
+            break
+        if n > FORCE_APPROXIMATION_THRESHOLD:
+            disp = _bucketRepulsion(pos, k)
+        else:
+            disp = _exactRepulsion(pos, k)
+
+        if len(edges):
+            delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 0.01)
+            force = delta * (dist / k)[:, None] # direction * dist² / k
+            disp -= _accumulate(edges[:, 0], force, n)
+            disp += _accumulate(edges[:, 1], force, n)
+
+        # gravity keeps disconnected parts of the graph from drifting away
+        disp -= FORCE_GRAVITY * (pos - pos.mean(axis=0))
+
+        # at the end, overlapping boxes push each other away too
+        if step >= iterations * (1 - FORCE_SEPARATION_PHASE):
+            push = _separation(pos, sizes)
+            if push is not None:
+                disp += push
+
+        length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 0.01)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    pos = removeOverlaps(pos, sizes, deadline=deadline)
+
+    corners = pos - (sizes - margin) / 2
+    corners -= corners.min(axis=0)
+    corners += margin
+    return {v: (int(round(corners[i, 0])), int(round(corners[i, 1]))) for i, v in enumerate(vertex_list)}
+
+
+def removeOverlaps(centers : np.ndarray, sizes : np.ndarray, passes : int = OVERLAP_PASSES, deadline : float | None = None) -> np.ndarray:
+    """Push overlapping boxes apart along their axis of least penetration, for at most `passes` passes or until `deadline`.
+
+    `centers` and `sizes` are (n, 2) arrays; `sizes` must already include the wanted spacing.
+    """
+    centers = centers.copy()
+    for _ in range(passes):
+        push = _separation(centers, sizes)
+        if push is None:
+            break
+        if _expired(deadline):
+            Logger.debug("Time budget spent, overlaps left to the final resolution pass")
+            break
+        centers += push
+    else:
+        Logger.debug(f"Overlaps remaining after {passes} passes")
+    return centers
+
+
+def _separation(centers : np.ndarray, sizes : np.ndarray):
+    """return the displacement separating every overlapping pair of boxes, or None if there is no overlap"""
+    i, j = _overlappingPairs(centers, sizes)
+    if len(i) == 0:
+        return None
+    delta = centers[i] - centers[j]
+    overlap = (sizes[i] + sizes[j]) / 2 - np.abs(delta) + 0.5
+    sign = np.where(delta >= 0, 1.0, -1.0)
+    alongX = overlap[:, 0] < overlap[:, 1]
+    push = np.zeros_like(delta)
+    push[alongX, 0] = sign[alongX, 0] * overlap[alongX, 0] / 2
+    push[~alongX, 1] = sign[~alongX, 1] * overlap[~alongX, 1] / 2
+    return _accumulate(np.concatenate((i, j)), np.concatenate((push, -push)), len(centers))
+
+
+def _overlappingPairs(centers : np.ndarray, sizes : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """return the indices (i, j) of every pair of overlapping boxes, using a sweep along x"""
+    left = centers[:, 0] - sizes[:, 0] / 2
+    right = centers[:, 0] + sizes[:, 0] / 2
+    order = np.argsort(left, kind='stable')
+    sortedLeft = left[order]
+    end = np.searchsorted(sortedLeft, right[order], side='left')
+    first = np.arange(len(order)) + 1
+    counts = np.maximum(end - first, 0)
+    a, b = expandRanges(first, counts)
+    i, j = order[a], order[b]
+    overlapY = np.abs(centers[i, 1] - centers[j, 1]) < (sizes[i, 1] + sizes[j, 1]) / 2
+    overlapX = np.abs(centers[i, 0] - centers[j, 0]) < (sizes[i, 0] + sizes[j, 0]) / 2
+    keep = overlapX & overlapY
+    return i[keep], j[keep]
+
+
+def _exactRepulsion(pos : np.ndarray, k : float) -> np.ndarray:
+    dx = pos[:, None, 0] - pos[None, :, 0]
+    dy = pos[:, None, 1] - pos[None, :, 1]
+    strength = k * k / np.maximum(dx * dx + dy * dy, 0.01)
+    return np.stack(((dx * strength).sum(axis=1), (dy * strength).sum(axis=1)), axis=1)
+
+
+def _bucketRepulsion(pos : np.ndarray, k : float) -> np.ndarray:
+    """Two-level grid-bucket approximation of the repulsion.
+
+    Vertices are sorted into fine buckets of width 2k, grouped in square blocks of coarse
+    buckets. A vertex is repelled exactly by the vertices of the adjacent fine buckets, by
+    the centroid of every other fine bucket of the adjacent coarse buckets, and by the
+    centroid of every remaining coarse bucket, as seen from its own coarse bucket.
+    """
+    n = len(pos)
+    fineCells = ((pos - pos.min(axis=0)) / (2 * k)).astype(np.int64)
+    fine = _Buckets(fineCells, pos)
+    # coarse buckets balance the vertex/fine-bucket and the coarse/coarse interactions
+    wanted = (4.5 * n * len(fine.keys)) ** (1 / 3)
+    block = max(1, int(round(math.sqrt(len(fine.keys) / wanted)))) # width of a coarse bucket, in fine buckets
+    coarseCells = fineCells // block
+    coarse = _Buckets(coarseCells, pos)
+
+    # exact repulsion, half of the neighbourhood is enough as each pair pushes both of its vertices
+    a, b = [], []
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        first, second = fine.neighbours(fine.cells[fine.of], dx, dy)
+        if dx == 0 and dy == 0:
+            keep = first < second
+            first, second = first[keep], second[keep]
+        a.append(first)
+        b.append(second)
+    i = fine.order[np.concatenate(a)]
+    j = fine.order[np.concatenate(b)]
+    i, j = np.concatenate((i, j)), np.concatenate((j, i))
+    disp = _accumulate(i, _repulsion(pos[i], pos[j], 1, k), n)
+
+    # fine buckets of the adjacent coarse buckets
+    fineBlocks = _Buckets(fine.cells // block, fine.centroids)
+    a, b = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            owners, found = fineBlocks.neighbours(coarse.cells[coarse.of], dx, dy)
+            a.append(owners)
+            b.append(found)
+    i = coarse.order[np.concatenate(a)]
+    f = fineBlocks.order[np.concatenate(b)]
+    keep = (np.abs(fine.cells[f] - fineCells[i]) > 1).any(axis=1)
+    i, f = i[keep], f[keep]
+    disp += _accumulate(i, _repulsion(pos[i], fine.centroids[f], fine.counts[f], k), n)
+
+    # remaining coarse buckets, evaluated once per coarse bucket
+    cx, cy = coarse.cells[:, 0], coarse.cells[:, 1]
+    far = (np.abs(cx[:, None] - cx[None, :]) > 1) | (np.abs(cy[:, None] - cy[None, :]) > 1)
+    dx = coarse.centroids[:, None, 0] - coarse.centroids[None, :, 0]
+    dy = coarse.centroids[:, None, 1] - coarse.centroids[None, :, 1]
+    strength = np.where(far, coarse.counts[None, :] * k * k / np.maximum(dx * dx + dy * dy, 0.01), 0.0)
+    field = np.stack(((dx * strength).sum(axis=1), (dy * strength).sum(axis=1)), axis=1)
+    disp[coarse.order] += field[coarse.of]
+    return disp
+
+
+def _repulsion(pos : np.ndarray, others : np.ndarray, weights, k : float) -> np.ndarray:
+    delta = pos - others
+    strength = weights * k * k / np.maximum((delta * delta).sum(axis=1), 0.01)
+    return delta * strength[:, None]
+
+
+class _Buckets:
+    """points sorted into square buckets, given the integer (non-negative) bucket coordinates of each point"""
+    def __init__(self, cells : np.ndarray, points : np.ndarray):
+        self.__stride = int(cells[:, 1].max()) + 3 # keeps neighbouring keys from wrapping into another column
+        keys = self.__key(cells)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.__starts = starts
+        self.counts = counts
+        self.of = np.searchsorted(self.keys, keys[self.order]) # bucket of each point, in the sorted order
+        self.cells = np.stack((self.keys // self.__stride - 1, self.keys % self.__stride - 1), axis=1)
+        self.centroids = _accumulate(self.of, points[self.order], len(self.keys)) / counts[:, None]
+
+    def __key(self, cells : np.ndarray) -> np.ndarray:
+        return (cells[:, 0] + 1) * self.__stride + cells[:, 1] + 1
+
+    def neighbours(self, cells : np.ndarray, dx : int, dy : int) -> tuple[np.ndarray, np.ndarray]:
+        """return (query, sorted point) index pairs, for every point of the bucket at offset (dx, dy) of each queried bucket coordinates"""
+        wanted = self.__key(cells + (dx, dy))
+        found = np.minimum(np.searchsorted(self.keys, wanted), len(self.keys) - 1)
+        counts = np.where(self.keys[found] == wanted, self.counts[found], 0)
+        return expandRanges(self.__starts[found], counts)
+
+
+def _accumulate(index : np.ndarray, values : np.ndarray, n : int) -> np.ndarray:
+    return np.stack((
+        np.bincount(index, values[:, 0], n),
+        np.bincount(index, values[:, 1], n)
+    ), axis=1)
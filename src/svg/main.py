@@ -3,30 +3,42 @@ import colour
 try:
     from .svg import SVG
     from .utils import createMissingClasses
-    from .customTypes import Class, _Enum, Relation, Element
+    from .customTypes import MemberLimits, NO_LIMITS
+    from .layout import LAYOUT
+    from .model import DiagramModel
+    from .state import LayoutState
+    from .cache import LayoutCache
+    from .profiling import Profile
+    from .routing import ROUTER
 except ImportError:
     from svg import SVG
     from utils import createMissingClasses
-    from customTypes import Class, _Enum, Relation, Element
-
-
-def createDiagram(data, color : colour.Color) -> SVG:
-    createMissingClasses(data)
+    from customTypes import MemberLimits, NO_LIMITS
+    from layout import LAYOUT
+    from model import DiagramModel
+    from state import LayoutState
+    from cache import LayoutCache
+    from profiling import Profile
+    from routing import ROUTER
+
+
+def createDiagram(data, color : colour.Color, layout : LAYOUT = LAYOUT.AUTO, state : LayoutState | None = None, cache : LayoutCache | None = None,
+                  layout_budget : float | None = None, attempts : int = 1, seed : int | None = None, router : ROUTER = ROUTER.ELBOW, profile : Profile | None = None,
+                  limits : MemberLimits = NO_LIMITS) -> SVG:
+    profile = profile or Profile()
     
-    objects = [
-        Class.fromDict(key, value) for key, value in data['classes'].items()
-    ]
-    enums = [
-        _Enum.fromDict(key, value) for key, value in data['enums'].items()
-    ]
+    with profile.step("model"):
+        createMissingClasses(data)
+        model = DiagramModel.fromDict(data, limits)
     
     svg = SVG(color)
 
     # place objects
-    svg.placeObjects(objects, enums)
+    svg.placeObjects(model, layout, state, cache, layout_budget, attempts, seed, profile)
 
     # place relations
-    svg.placeRelations(objects, data)
+    with profile.step("relations"):
+        svg.placeRelations(model, router)
     
     return svg
 
@@ -0,0 +1,191 @@
+from typing import Sequence
+
+import numpy as np
+
+try:
+    from .customTypes import Element, Relation
+except ImportError:
+    from customTypes import Element, Relation
+
+PAIRS_PER_CHUNK = 1 << 22 # candidate pairs tested at once, bounds the memory used
+
+
+class LayoutMetrics:
+    """Quality measures of a placed diagram"""
+    def __init__(self, elements : int, relations : int, crossings : int, boxCrossings : int, overlaps : int, edgeLength : float, fillRatio : float):
+        self.elements = elements
+        self.relations = relations
+        self.crossings = crossings          # pairs of relation segments crossing each other
+        self.boxCrossings = boxCrossings    # (relation, element) pairs where the relation goes through an element other than its ends
+        self.overlaps = overlaps            # pairs of overlapping elements
+        self.edgeLength = edgeLength        # total length of the relations
+        self.fillRatio = fillRatio          # area of the elements over the area of the canvas
+
+    def asDict(self) -> dict:
+        return dict(vars(self))
+
+    def __str__(self) -> str:
+        return f"{self.elements} elements, {self.relations} relations: {self.crossings} crossings, " \
+               f"{self.boxCrossings} relations through boxes, {self.overlaps} overlaps, " \
+               f"edge length {self.edgeLength:.0f}, fill ratio {self.fillRatio:.1%}"
+
+
+def computeMetrics(elements : Sequence[Element], relations : Sequence[Relation]) -> LayoutMetrics:
+    """Measure a placed diagram, with the relations routed as `Relation.segments` draws them.
+
+    The canvas is the bounding box of the elements and the relations.
+    """
+    index = {id(element): i for i, element in enumerate(elements)}
+    boxes = np.array([element.box for element in elements], dtype=float).reshape(-1, 4)
+    boxes[:, 2:] += boxes[:, :2] # form of (x1, y1, x2, y2)
+
+    segments, owners = [], [] # owners holds (relation, source element, target element) for each segment
+    for r, relation in enumerate(relations):
+        ends = (r, index.get(id(relation.source), -1), index.get(id(relation.target), -1))
+        for (x1, y1), (x2, y2) in relation.segments():
+            segments.append((x1, y1, x2, y2))
+            owners.append(ends)
+    segments = np.array(segments, dtype=float).reshape(-1, 4)
+    owners = np.array(owners, dtype=np.int64).reshape(-1, 3)
+
+    i, j = crossingPairs(segments)
+    crossings = int(np.count_nonzero(owners[i, 0] != owners[j, 0]))
+
+    bounds = np.column_stack([np.minimum(segments[:, 0], segments[:, 2]), np.minimum(segments[:, 1], segments[:, 3]),
+                              np.maximum(segments[:, 0], segments[:, 2]), np.maximum(segments[:, 1], segments[:, 3])])
+    s, b = _rectanglePairs(bounds, boxes)
+    keep = (owners[s, 1] != b) & (owners[s, 2] != b)
+    s, b = s[keep], b[keep]
+    through = _throughBox(segments[s], boxes[b])
+    boxCrossings = len(np.unique(owners[s[through], 0] * len(elements) + b[through]))
+
+    a, b = _rectanglePairs(boxes, boxes)
+    overlaps = int(np.count_nonzero((a < b) & _strictlyOverlap(boxes[a], boxes[b])))
+
+    edgeLength = float(np.sum(np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])))
+
+    everything = np.vstack([boxes, bounds])
+    if len(everything):
+        extent = everything[:, 2:].max(axis=0) - everything[:, :2].min(axis=0)
+        canvas = float(extent[0] * extent[1])
+    else:
+        canvas = 0.0
+    area = float(np.sum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])))
+    fillRatio = area / canvas if canvas > 0 else 0.0
+
+    return LayoutMetrics(len(elements), len(relations), crossings, boxCrossings, overlaps, edgeLength, fillRatio)
+
+
+def crossingPairs(segments : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the indices (i, j) of every pair of segments crossing each other.
+
+    `segments` is an (n, 4) array of (x1, y1, x2, y2). Segments sharing an endpoint,
+    touching or collinear do not count as crossing. Candidates are found with a sweep
+    on x, then filtered on y before the exact orientation test.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+    n = len(segments)
+    empty = np.zeros(0, dtype=np.int64)
+    if n < 2:
+        return empty, empty
+    xmin = np.minimum(segments[:, 0], segments[:, 2])
+    xmax = np.maximum(segments[:, 0], segments[:, 2])
+    ymin = np.minimum(segments[:, 1], segments[:, 3])
+    ymax = np.maximum(segments[:, 1], segments[:, 3])
+
+    order = np.argsort(xmin, kind='stable')
+    # in x order, segment k may only cross the following ones starting before it ends
+    ends = np.searchsorted(xmin[order], xmax[order], side='right')
+    starts = np.arange(1, n + 1)
+    counts = np.maximum(ends - starts, 0)
+
+    found_i, found_j = [], []
+    bounds = np.cumsum(counts)
+    k = 0
+    while k < n:
+        # as many queries as fit in a chunk, at least one
+        stop = max(int(np.searchsorted(bounds, bounds[k] - counts[k] + PAIRS_PER_CHUNK, side='right')), k + 1)
+        first, second = expandRanges(starts[k:stop], counts[k:stop])
+        i = order[first + k]
+        j = order[second]
+        keep = (ymin[i] <= ymax[j]) & (ymin[j] <= ymax[i])
+        i, j = i[keep], j[keep]
+        crossing = _properlyCross(segments[i], segments[j])
+        found_i.append(i[crossing])
+        found_j.append(j[crossing])
+        k = stop
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def countCrossings(segments : np.ndarray) -> int:
+    return len(crossingPairs(segments)[0])
+
+
+def _orientation(ax, ay, bx, by, cx, cy) -> np.ndarray:
+    """sign of the turn a -> b -> c: 1 counterclockwise, -1 clockwise, 0 collinear"""
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _properlyCross(a : np.ndarray, b : np.ndarray) -> np.ndarray:
+    o1 = _orientation(a[:, 0], a[:, 1], a[:, 2], a[:, 3], b[:, 0], b[:, 1])
+    o2 = _orientation(a[:, 0], a[:, 1], a[:, 2], a[:, 3], b[:, 2], b[:, 3])
+    o3 = _orientation(b[:, 0], b[:, 1], b[:, 2], b[:, 3], a[:, 0], a[:, 1])
+    o4 = _orientation(b[:, 0], b[:, 1], b[:, 2], b[:, 3], a[:, 2], a[:, 3])
+    return (o1 * o2 < 0) & (o3 * o4 < 0)
+
+
+def _rectanglePairs(a : np.ndarray, b : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the indices (i, j) of every rectangle of `a` touching or overlapping one of `b`.
+
+    Rectangles are rows of (x1, y1, x2, y2). Two x intervals overlap when one of them starts
+    inside the other, so both cases are found by a binary search over the sorted starts.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(a) == 0 or len(b) == 0:
+        return empty, empty
+    orderA = np.argsort(a[:, 0], kind='stable')
+    orderB = np.argsort(b[:, 0], kind='stable')
+    startsA = a[orderA, 0]
+    startsB = b[orderB, 0]
+
+    # b starting inside [a.x1, a.x2]
+    first = np.searchsorted(startsB, a[:, 0], side='left')
+    last = np.searchsorted(startsB, a[:, 2], side='right')
+    i1, k = expandRanges(first, np.maximum(last - first, 0))
+    j1 = orderB[k]
+    # a starting inside (b.x1, b.x2]
+    first = np.searchsorted(startsA, b[:, 0], side='right')
+    last = np.searchsorted(startsA, b[:, 2], side='right')
+    j2, k = expandRanges(first, np.maximum(last - first, 0))
+    i2 = orderA[k]
+
+    i = np.concatenate([i1, i2])
+    j = np.concatenate([j1, j2])
+    keep = (a[i, 1] <= b[j, 3]) & (b[j, 1] <= a[i, 3])
+    return i[keep], j[keep]
+
+
+def _strictlyOverlap(a : np.ndarray, b : np.ndarray) -> np.ndarray:
+    return (a[:, 0] < b[:, 2]) & (b[:, 0] < a[:, 2]) & (a[:, 1] < b[:, 3]) & (b[:, 1] < a[:, 3])
+
+
+def _throughBox(segments : np.ndarray, boxes : np.ndarray) -> np.ndarray:
+    """whether each segment goes through the interior of the matching box (Liang-Barsky clipping)"""
+    x, y = segments[:, 0], segments[:, 1]
+    dx, dy = segments[:, 2] - x, segments[:, 3] - y
+    p = np.stack([-dx, dx, -dy, dy])
+    q = np.stack([x - boxes[:, 0], boxes[:, 2] - x, y - boxes[:, 1], boxes[:, 3] - y])
+    parallel = p == 0
+    outside = np.any(parallel & (q <= 0), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+    enter = np.max(np.where(p < 0, t, 0.0), axis=0)
+    leave = np.min(np.where(p > 0, t, 1.0), axis=0)
+    return ~outside & (enter < leave)
+
+
+def expandRanges(starts : np.ndarray, counts : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """return, for each query q, the pairs (q, starts[q] + r) for r in range(counts[q])"""
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, starts[owners] + offsets
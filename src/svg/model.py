@@ -0,0 +1,148 @@
+from typing import Sequence
+
+import numpy as np
+
+try:
+    from .customTypes import Class, _Enum, Element, Stub, Package, MemberLimits, NO_LIMITS
+except ImportError:
+    from customTypes import Class, _Enum, Element, Stub, Package, MemberLimits, NO_LIMITS
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Model")
+
+
+class DiagramModel:
+    """Elements of a diagram, indexed by name.
+
+    Classes come first in `elements`, so a class index is also its element index.
+    `inheritance`, `composition`, `aggregation` and `dependency` hold, for each class, the indices
+    of the elements it points to. `boxes` holds the (x, y, width, height) of every
+    element, as set by `place`.
+    """
+    def __init__(self, classes : Sequence[Class], enums : Sequence[_Enum]):
+        self.classes = list(classes)
+        self.enums = list(enums)
+        self.elements = [*self.classes, *self.enums] # type: list[Element]
+        self.index = {element.name: i for i, element in enumerate(self.elements)} # type: dict[str, int]
+
+        self.inheritance = [self.__resolve(c, c.inheritFrom) for c in self.classes] # type: list[list[int]]
+        self.composition = [self.__resolve(c, c.composition) for c in self.classes] # type: list[list[int]]
+        self.aggregation = [self.__resolve(c, c.aggregation) for c in self.classes] # type: list[list[int]]
+        self.dependency = [self.__resolve(c, c.dependencies) for c in self.classes] # type: list[list[int]]
+
+        self.boxes = np.array([element.box for element in self.elements], dtype=np.int64).reshape(-1, 4)
+
+        self.__hierarchy = None # type: HierarchyIndex|None
+        for i, c in enumerate(self.classes):
+            c.model, c.index = self, i
+
+    def __resolve(self, source : Class, names : Sequence[str]) -> list[int]:
+        targets = []
+        for name in names:
+            if name in self.index:
+                targets.append(self.index[name])
+            else:
+                Logger.warning(f"Class {name} referenced by class {source.name} is not defined")
+        return targets
+
+    @staticmethod
+    def fromDict(data : dict, limits : MemberLimits = NO_LIMITS) -> 'DiagramModel':
+        """model of parsed data, the boxes showing the members allowed by `limits`;
+        the classes of other pages of a sharded diagram are in 'stubs', the packages of its overview in 'packages'"""
+        return DiagramModel(
+            [
+                *(Class.fromDict(key, value, limits) for key, value in data['classes'].items()),
+                *(Stub.fromDict(key, value) for key, value in data.get('stubs', {}).items()),
+                *(Package.fromDict(key, value) for key, value in data.get('packages', {}).items())
+            ],
+            [_Enum.fromDict(key, value, limits) for key, value in data['enums'].items()]
+        )
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def __contains__(self, name : str) -> bool:
+        return name in self.index
+
+    def get(self, name : str) -> Element:
+        return self.elements[self.index[name]]
+
+    def place(self, positions : Sequence[tuple[int, int]]) -> None:
+        """place every element at the matching top-left corner"""
+        for element, (x, y) in zip(self.elements, positions):
+            element.place(x, y)
+        self.boxes = np.array([element.box for element in self.elements], dtype=np.int64).reshape(-1, 4)
+
+    @property
+    def hierarchy(self) -> 'HierarchyIndex':
+        """inheritance hierarchy of the classes, computed on first access"""
+        if self.__hierarchy is None:
+            self.__hierarchy = HierarchyIndex(self.inheritance, len(self.classes))
+        return self.__hierarchy
+
+    def getBestX(self, i : int) -> int:
+        """return the x coordinate centering class `i` under its parents, or -1 if it has none"""
+        parents = self.inheritance[i]
+        if len(parents) == 0:
+            return -1
+        best = sum(self.elements[parent].S[0] for parent in parents) // len(parents)
+        return best - self.classes[i].width // 2
+
+    def edges(self) -> list[tuple[int, int]]:
+        """return every (source, target) pair of classes linked by an inheritance, a composition, an aggregation or a dependency"""
+        return [
+            (i, target)
+            for i in range(len(self.classes))
+            for adjacency in (self.inheritance, self.composition, self.aggregation, self.dependency)
+            for target in adjacency[i]
+            if target < len(self.classes)
+        ]
+
+
+class HierarchyIndex:
+    """Topological order, levels and tree sizes of an inheritance graph, computed once in O(V+E).
+
+    `parents` holds, for each class, the indices of the elements it inherits from;
+    indices of `count` or more (enums) are ignored.
+    """
+    def __init__(self, parents : Sequence[Sequence[int]], count : int):
+        self.parents = [list(dict.fromkeys(p for p in ps if p < count)) for ps in parents[:count]]
+        self.children = [[] for _ in range(count)] # type: list[list[int]]
+        for child, ps in enumerate(self.parents):
+            for parent in ps:
+                self.children[parent].append(child)
+
+        self.order = self.__topologicalOrder(count)
+
+        # number of ancestors on the longest path to a root
+        self.levels = [0] * count
+        for i in self.order:
+            for parent in self.parents[i]:
+                self.levels[i] = max(self.levels[i], self.levels[parent] + 1)
+
+        # level of the class, plus the tree sizes of all of its children
+        self.treeSizes = [0] * count
+        for i in reversed(self.order):
+            self.treeSizes[i] = self.levels[i] + sum(self.treeSizes[child] for child in self.children[i])
+        self.treeSizes = [size + 1 for size in self.treeSizes]
+
+    def __topologicalOrder(self, count : int) -> list[int]:
+        """parents before children (Kahn's algorithm); classes caught in a cycle come last, in index order"""
+        remaining = [len(ps) for ps in self.parents]
+        order = [i for i in range(count) if remaining[i] == 0]
+        for i in order: # order grows while iterating
+            for child in self.children[i]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    order.append(child)
+        if len(order) < count:
+            cyclic = [i for i in range(count) if remaining[i] > 0]
+            Logger.warning(f"Inheritance cycle between {len(cyclic)} classes")
+            order += cyclic
+        return order
+
+    def level(self, i : int) -> int:
+        return self.levels[i]
+
+    def treeSize(self, i : int) -> int:
+        return self.treeSizes[i]
@@ -0,0 +1,70 @@
+import math
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Packing")
+
+
+def packRectangles(sizes : list[tuple[int, int]], margin : int) -> list[tuple[int, int]]:
+    """Skyline bottom-left packing of rectangles into a near-square area.
+
+    `sizes` holds the (width, height) of each rectangle; `margin` is kept between rectangles
+    and around the packed area. Return the top-left corner of each rectangle, in input order.
+    """
+    if not sizes:
+        return []
+    padded = [(w + margin, h + margin) for w, h in sizes]
+    area = sum(w * h for w, h in padded)
+    width = max(max(w for w, _ in padded), int(math.ceil(math.sqrt(area))))
+
+    skyline = [[0, 0, width]] # segments of the form [x, y, width], sorted by x
+    positions = [(0, 0)] * len(sizes)
+    # tallest first, so each shelf of the skyline stays as flat as possible
+    for i in sorted(range(len(padded)), key=lambda i: (-padded[i][1], -padded[i][0], i)):
+        w, h = padded[i]
+        best = None # of the form (y, x, segment index)
+        for s, (x, _, _) in enumerate(skyline):
+            if x + w > width:
+                break
+            y = _restingHeight(skyline, s, w)
+            if best is None or (y, x) < best[:2]:
+                best = (y, x, s)
+        y, x, s = best #type: ignore
+        _raiseSkyline(skyline, s, x, y + h, w)
+        positions[i] = (x + margin, y + margin)
+
+    Logger.debug(f"Packed {len(sizes)} rectangles in a {width}px wide area")
+    return positions
+
+
+def _restingHeight(skyline : list[list[int]], start : int, width : int) -> int:
+    """return the height at which a rectangle of the given width rests, with its left side on segment `start`"""
+    x = skyline[start][0]
+    y = 0
+    for sx, sy, sw in skyline[start:]:
+        if sx >= x + width:
+            break
+        y = max(y, sy)
+    return y
+
+
+def _raiseSkyline(skyline : list[list[int]], start : int, x : int, y : int, width : int) -> None:
+    """cover [x, x + width) with a segment at height y, starting from segment `start`"""
+    end = x + width
+    i = start
+    while i < len(skyline) and skyline[i][0] < end:
+        sx, sy, sw = skyline[i]
+        if sx + sw <= end:
+            del skyline[i]
+        else:
+            skyline[i] = [end, sy, sx + sw - end]
+            break
+    skyline.insert(start, [x, y, width])
+
+    # merge neighbours at the same height
+    i = max(start - 1, 0)
+    while i < min(start + 2, len(skyline) - 1):
+        if skyline[i][1] == skyline[i + 1][1]:
+            skyline[i][2] += skyline[i + 1][2]
+            del skyline[i + 1]
+        else:
+            i += 1
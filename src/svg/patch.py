@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+from collections import defaultdict
+
+import lxml.etree as ET
+
+try:
+    from .customTypes import Element, Relation
+    from .state import LayoutState
+except ImportError:
+    from customTypes import Element, Relation
+    from state import LayoutState
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Patch")
+
+SVG_NAMESPACE = ' xmlns="http://www.w3.org/2000/svg"'
+
+
+def elementDigest(element : Element) -> str:
+    """digest of what the group of an element shows, wherever it is placed"""
+    parts = [type(element).__name__, element.name, getattr(element, "href", "")]
+    parts += (f"{row.kind.value} {row.text}" for row in getattr(element, "rows", []))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def relationKey(relation : Relation) -> tuple[str, str, str]:
+    return relation.source.name, relation.target.name, relation.relationType.name
+
+
+def remember(state : LayoutState, items : list[Element | Relation], options : dict) -> None:
+    """record in `state` what the output written from `items` with `options` is made of"""
+    state.digests = {item.name: elementDigest(item) for item in items if isinstance(item, Element)}
+    state.relations = [relationKey(item) for item in items if isinstance(item, Relation)]
+    state.options = options
+
+
+def previousNodes(filename : str, pretty : bool) -> tuple[dict[str, str], list[str]]:
+    """Text of the nodes of a previous output: the groups of the elements by id, and the relations in drawing order.
+
+    The default namespace is dropped before parsing, so that every node serializes as it was written.
+    """
+    with open(filename, "rb") as file:
+        content = file.read()
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    root = ET.fromstring(content.replace(SVG_NAMESPACE.encode("utf-8"), b"", 1))
+    elements = {} # type: dict[str, str]
+    relations = [] # type: list[str]
+    for node in root:
+        text = ET.tostring(node, encoding="unicode", with_tail=False) + ("\n" if pretty else "")
+        if node.tag == "path":
+            relations.append(text)
+        elif node.tag == "g":
+            elements[node.get("id")] = text
+        elif node.tag == "a" and len(node) > 0: # a linked group: a stub or a package
+            elements[node[0].get("id")] = text
+    return elements, relations
+
+
+def reusable(items : list[Element | Relation], previous : LayoutState, filename : str, options : dict) -> dict[int, str]:
+    """Text of the nodes of the previous output `filename` that can be written again as they are, by index in `items`.
+
+    The group of an element is reused if the element has the same content and the same box as in `previous`;
+    a relation is reused if it links the same elements as before, both of them reused, and is drawn as an
+    elbow line, which only depends on the boxes it links (an orthogonal route depends on every box).
+    Nothing is reused if the previous output was written with other `options`.
+    """
+    if previous.options != options:
+        Logger.info("The output options changed, writing every element again")
+        return {}
+    try:
+        groups, paths = previousNodes(filename, not options['minify'])
+    except (OSError, ET.XMLSyntaxError) as e:
+        Logger.warning(f"Cannot read the previous output {filename}, writing every element again: {e}")
+        return {}
+    if len(paths) != len(previous.relations):
+        Logger.warning(f"{filename} does not match its layout state, writing every element again")
+        return {}
+
+    reuse = {} # type: dict[int, str]
+    unchanged = set() # type: set[str]
+    for i, item in enumerate(items):
+        if isinstance(item, Element) and item.name in groups and previous.digests.get(item.name) == elementDigest(item) \
+                and tuple(previous.elements.get(item.name, ())) == item.box:
+            reuse[i] = groups[item.name]
+            unchanged.add(item.name)
+    elements = len(reuse)
+
+    relations = 0
+    if options['router'] == "elbow":
+        previousPaths = defaultdict(list) # type: dict[tuple[str, str, str], list[str]]
+        for key, path in zip(previous.relations, paths):
+            previousPaths[tuple(key)].append(path)
+        for i, item in enumerate(items):
+            if isinstance(item, Relation) and item.source.name in unchanged and item.target.name in unchanged:
+                candidates = previousPaths.get(relationKey(item))
+                if candidates:
+                    reuse[i] = candidates.pop(0)
+                    relations += 1
+
+    total = sum(isinstance(item, Element) for item in items)
+    Logger.info(f"Reused {elements} of {total} elements and {relations} of {len(items) - total} relations from {filename}")
+    return reuse
@@ -0,0 +1,28 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class Profile:
+    """Wall time spent in each step of a run, and notes on how the steps went"""
+    def __init__(self):
+        self.steps = {} # type: dict[str, float]
+        self.notes = [] # type: list[str]
+
+    @contextmanager
+    def step(self, name : str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = self.steps.get(name, 0.0) + time.perf_counter() - start
+
+    def note(self, message : str) -> None:
+        self.notes.append(message)
+
+    def report(self) -> str:
+        width = max((len(name) for name in self.steps), default=0)
+        lines = ["Profile:"]
+        lines += [f"  {name.ljust(width)}  {duration:8.3f}s" for name, duration in self.steps.items()]
+        lines += [f"  {note}" for note in self.notes]
+        return "\n".join(lines)
@@ -0,0 +1,191 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from itertools import repeat
+from typing import BinaryIO, Iterable, Iterator
+
+import lxml.etree as ET
+
+try:
+    from .customTypes import Class, _Enum, Element, Relation, Row, ROW_KIND, LINE_TYPE, Number, PathData, \
+        ATTRIBUTE_FONT_SIZE, TITLE_FONT_SIZE, SEPARATOR_HEIGHT, TEXT_PADDING
+    from .utils import getTextHeight
+except ImportError:
+    from customTypes import Class, _Enum, Element, Relation, Row, ROW_KIND, LINE_TYPE, Number, PathData, \
+        ATTRIBUTE_FONT_SIZE, TITLE_FONT_SIZE, SEPARATOR_HEIGHT, TEXT_PADDING
+    from utils import getTextHeight
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Render")
+
+
+class RENDERER(Enum):
+    LXML = "lxml"   # one lxml element per node, serialized by lxml
+    FAST = "fast"   # text written from the templates below, same bytes as lxml
+
+    def __str__(self):
+        return self.value
+
+
+# templates of the nodes written by the `build` methods of customTypes, with their attributes in the same order
+GROUP = '<g class="{kind}" id="{id}" transform="translate({x} {y})">'
+BORDER = '<rect class="border" width="{width}" height="{height}"/>'
+TITLE = '<text class="{kind}" x="{x}" y="{y}">{text}</text>'
+SEPARATOR = '<line class="separator" x1="0" y1="{y}" x2="{width}" y2="{y}"/>'
+ROW = '<text class="{kind}" x="' + str(TEXT_PADDING) + '" y="{y}">{text}</text>'
+MEMBERS = '<g class="members">'
+RELATION = '<path d="{d}" class="{kind}" marker-end="url(#{marker})"/>'
+
+ROW_HEIGHT = getTextHeight(ATTRIBUTE_FONT_SIZE)
+
+CHUNK_SIZE = 500 # items rendered at once, by one process
+PARALLEL_THRESHOLD = 4 * CHUNK_SIZE # below this number of items, starting processes costs more than it saves
+
+_TEXT_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\r": "&#13;"})
+_ATTRIBUTE_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"})
+
+
+def escapeText(text : str) -> str:
+    """escape the text content of a node the way lxml does"""
+    return text.translate(_TEXT_ESCAPES)
+
+
+def escapeAttribute(value : str) -> str:
+    """escape the value of a double-quoted attribute the way lxml does"""
+    return value.translate(_ATTRIBUTE_ESCAPES)
+
+
+def _group(open : str, children : list[str], pretty : bool) -> str:
+    if pretty:
+        return open + "\n" + "".join(f"  {child}\n" for child in children) + "</g>\n"
+    return open + "".join(children) + "</g>"
+
+
+def _members(rows : list[str], pretty : bool) -> str:
+    """the group of the member rows of a box, as a child of its group"""
+    if pretty:
+        return MEMBERS + "\n" + "".join(f"    {row}\n" for row in rows) + "  </g>"
+    return MEMBERS + "".join(rows) + "</g>"
+
+
+def _rows(rows : Iterable[Row], y : int, children : list[str]) -> int:
+    """append the rows, starting at `y`; return the y after them"""
+    for row in rows:
+        children.append(ROW.format(kind=row.kind.value, y=y, text=escapeText(row.text)))
+        y += ROW_HEIGHT
+    return y
+
+
+def renderClass(element : Class, precision : int | None = None, pretty : bool = True, lod : bool = False) -> str:
+    """same text as the serialization of `Class.build`"""
+    width = element.width
+    children = [BORDER.format(width=width, height=element.height)]
+    y = 0
+    children.append(TITLE.format(kind="className", x=Number(width/2, precision), y=y + ATTRIBUTE_FONT_SIZE + 5, text=escapeText(element.name)))
+    y += getTextHeight(TITLE_FONT_SIZE) + 5
+    children.append(SEPARATOR.format(y=y, width=width))
+    y += SEPARATOR_HEIGHT
+    members = [] if lod and element.rows else children
+    y = _rows((row for row in element.rows if row.kind != ROW_KIND.METHOD), y, members)
+    children.append(SEPARATOR.format(y=y, width=width))
+    y += SEPARATOR_HEIGHT
+    _rows((row for row in element.rows if row.kind == ROW_KIND.METHOD), y, members)
+    if members is not children:
+        children.insert(-1, _members(members, pretty)) # before the last separator, where `Class.build` puts it
+    open = GROUP.format(kind="class", id=escapeAttribute(element.name), x=Number(element.x, precision), y=Number(element.y, precision))
+    return _group(open, children, pretty)
+
+
+def renderEnum(element : _Enum, precision : int | None = None, pretty : bool = True, lod : bool = False) -> str:
+    """same text as the serialization of `_Enum.build`"""
+    width = element.width
+    x = Number(width/2, precision)
+    children = [BORDER.format(width=width, height=element.height)]
+    y = 0
+    children.append(TITLE.format(kind="enumSurTitle", x=x, y=y + ATTRIBUTE_FONT_SIZE + 5, text="&lt;&lt;enumeration&gt;&gt;"))
+    y += getTextHeight(ATTRIBUTE_FONT_SIZE) + 5
+    children.append(TITLE.format(kind="enumName", x=x, y=y + ATTRIBUTE_FONT_SIZE + 5, text=escapeText(element.name)))
+    y += getTextHeight(TITLE_FONT_SIZE) + 5
+    children.append(SEPARATOR.format(y=y, width=width))
+    y += SEPARATOR_HEIGHT
+    members = [] if lod and element.rows else children
+    y = _rows((row for row in element.rows if row.kind == ROW_KIND.VALUE), y, members)
+    children.append(SEPARATOR.format(y=y, width=width))
+    y += SEPARATOR_HEIGHT
+    _rows((row for row in element.rows if row.kind == ROW_KIND.METHOD), y, members)
+    if members is not children:
+        children.insert(-1, _members(members, pretty))
+    open = GROUP.format(kind="enum", id=escapeAttribute(element.name), x=Number(element.x, precision), y=Number(element.y, precision))
+    return _group(open, children, pretty)
+
+
+def renderRelation(relation : Relation, precision : int | None = None, pretty : bool = True) -> str:
+    """same text as the serialization of `Relation.build`"""
+    lineType, marker = relation.appearance()
+    kind = "relation dashed" if lineType == LINE_TYPE.DASHED else "relation"
+    text = RELATION.format(d=PathData(relation.points(), precision), kind=kind, marker=marker)
+    return text + "\n" if pretty else text
+
+
+def render(item : Element | Relation | str, precision : int | None = None, pretty : bool = True, renderer : RENDERER = RENDERER.FAST, lod : bool = False) -> str:
+    """text of an element or a relation, as lxml would write its `build`; an item already written is a string, given back as is"""
+    if isinstance(item, str):
+        return item
+    if renderer == RENDERER.FAST:
+        # exact types: the subclasses of Class (stubs, packages) are written by lxml
+        if type(item) is Relation:
+            return renderRelation(item, precision, pretty) #type: ignore
+        if type(item) is Class:
+            return renderClass(item, precision, pretty, lod)
+        if type(item) is _Enum:
+            return renderEnum(item, precision, pretty, lod)
+    return ET.tostring(item.build(precision, lod), encoding="unicode", pretty_print=pretty) #type: ignore
+
+
+def renderChunk(items : Iterable[Element | Relation | str], precision : int | None = None, pretty : bool = True, renderer : RENDERER = RENDERER.FAST,
+                 lod : bool = False) -> bytes:
+    """utf-8 text of several items, one after the other"""
+    return "".join(render(item, precision, pretty, renderer, lod) for item in items).encode("utf-8")
+
+
+_shared = [] # type: list[Element|Relation|str] # items of the diagram, in each process of the pool
+
+
+def _share(items : list[Element | Relation | str]) -> None:
+    global _shared
+    _shared = items
+
+
+def _renderRange(start : int, stop : int, precision : int | None, pretty : bool, renderer : RENDERER, lod : bool) -> bytes:
+    return renderChunk(_shared[start:stop], precision, pretty, renderer, lod)
+
+
+def _chunks(items : list[Element | Relation | str], precision : int | None, pretty : bool, renderer : RENDERER, jobs : int, lod : bool) -> Iterator[bytes]:
+    """the rendered items, CHUNK_SIZE at a time, in their order"""
+    starts = range(0, len(items), CHUNK_SIZE)
+    if jobs <= 1 or len(items) < PARALLEL_THRESHOLD:
+        for start in starts:
+            yield renderChunk(items[start:start + CHUNK_SIZE], precision, pretty, renderer, lod)
+        return
+    Logger.debug(f"Rendering {len(items)} items in {jobs} processes")
+    # the items are handed to each process once, when it starts; a task is only a range of them
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_share, initargs=(items,)) as pool:
+        yield from pool.map(_renderRange, starts, [start + CHUNK_SIZE for start in starts], repeat(precision), repeat(pretty), repeat(renderer), repeat(lod))
+
+
+def openTag(tag : str, attrib : dict[str, str]) -> str:
+    return f"<{tag}" + "".join(f' {key}="{escapeAttribute(value)}"' for key, value in attrib.items()) + ">"
+
+
+def writeFragments(stream : BinaryIO, attrib : dict[str, str], head : Iterable[ET._Element], items : list[Element | Relation | str], tail : Iterable[ET._Element],
+                    precision : int | None = None, pretty : bool = True, renderer : RENDERER = RENDERER.FAST, jobs : int = 1, lod : bool = False) -> None:
+    """Write an <svg> root with `attrib`, holding the `head` nodes, the items and the `tail` nodes.
+
+    The few nodes of `head` and `tail` go through lxml; the items are rendered in chunks, by `jobs`
+    processes if there are enough of them, and written in their order, so the output is the same
+    whatever the number of processes, and is never held in memory as a whole.
+    """
+    stream.write((openTag("svg", attrib) + ("\n" if pretty else "")).encode("utf-8"))
+    stream.write("".join(ET.tostring(node, encoding="unicode", pretty_print=pretty) for node in head).encode("utf-8"))
+    for chunk in _chunks(items, precision, pretty, renderer, jobs, lod):
+        stream.write(chunk)
+    stream.write(("".join(ET.tostring(node, encoding="unicode", pretty_print=pretty) for node in tail) + "</svg>").encode("utf-8"))
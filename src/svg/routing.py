@@ -0,0 +1,267 @@
+import heapq
+import time
+from enum import Enum
+from typing import Sequence
+
+import numpy as np
+
+try:
+    from .customTypes import Element, Relation
+    from .spatial import SpatialIndex
+except ImportError:
+    from customTypes import Element, Relation
+    from spatial import SpatialIndex
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Routing")
+
+
+PAD = 25 # distance between a box and the routing lines around it
+BEND_COST = 100 # cost of a bend, in pixels of route length
+WINDOW_MARGINS = (200, 800, 3200) # margins of the successive search windows around the ends of a relation
+CHANNEL_SPACING = 8 # distance between parallel segments sharing a routing line
+MAX_GRID_NODES = 250_000 # larger windows are not searched
+MAX_EXPANSIONS = 20_000 # states expanded by A* for one relation, over all of its windows, before it keeps the elbow line
+ROUTING_SECONDS = 10.0 # time spent routing before the remaining relations keep the elbow line
+
+# moves of the A* search, of the form (di, dj); index is the direction
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class ROUTER(Enum):
+    ELBOW = "elbow"
+    ORTHOGONAL = "orthogonal"
+
+    def __str__(self):
+        return self.value
+
+
+Point = tuple[int, int]
+
+
+def routeRelations(elements : Sequence[Element], relations : Sequence[Relation], seconds : float | None = ROUTING_SECONDS) -> list[list[Point]]:
+    """Orthogonal routes of the relations, avoiding the boxes of the elements.
+
+    Each route goes from the end of the start step of the relation to the start of its arrow
+    step (see `Relation.anchors`). It is searched with A* on a sparse grid made of lines running
+    PAD away from the sides of the boxes around the relation, in a window that grows until a
+    route is found. The windows of a relation share MAX_EXPANSIONS expansions, and a search that
+    runs out of them is not tried again in a larger window; a relation without route keeps the
+    elbow line, as do all the relations left once `seconds` have passed. Parallel segments sharing a
+    routing line are then spread over separate channels. Return one list of points per relation.
+    """
+    cellSize = sum(element.width + element.height for element in elements) / (2 * len(elements)) if elements else 1
+    index = SpatialIndex(cellSize)
+    for i, element in enumerate(elements):
+        index.insert(i, element.box)
+    boxes = np.array([element.box for element in elements], dtype=float).reshape(-1, 4)
+    boxes[:, 2:] += boxes[:, :2] # form of (x1, y1, x2, y2)
+
+    deadline = time.time() + seconds if seconds is not None else None
+    routes = []
+    failed = late = 0
+    for relation in relations:
+        startPoint, start, goal, endPoint = relation.anchors()
+        route = None
+        if deadline is not None and time.time() >= deadline:
+            late += 1
+        else:
+            startDir = _direction(startPoint, start)
+            goalDir = _direction(goal, endPoint)
+            budget = MAX_EXPANSIONS
+            for margin in WINDOW_MARGINS:
+                window = (min(start[0], goal[0]) - margin, min(start[1], goal[1]) - margin,
+                          abs(start[0] - goal[0]) + 2 * margin, abs(start[1] - goal[1]) + 2 * margin)
+                route, spent = _routeInWindow(boxes[index.query(window)], window, start, goal, startDir, goalDir, budget)
+                budget -= spent
+                if route is not None or budget <= 0:
+                    break
+            if route is None:
+                failed += 1
+        routes.append(route or _elbow(start, goal))
+    if failed:
+        Logger.debug(f"No orthogonal route found for {failed} relations, they keep the elbow line")
+    if late:
+        Logger.warning(f"Routing took more than {seconds}s, the last {late} relations keep the elbow line")
+
+    _separateChannels(routes)
+    return routes
+
+
+def _direction(a : Point, b : Point) -> int:
+    """index in DIRECTIONS of the move from a to b, along one axis"""
+    if b[0] != a[0]:
+        return 0 if b[0] > a[0] else 1
+    return 2 if b[1] > a[1] else 3
+
+
+def _elbow(start : Point, goal : Point) -> list[Point]:
+    if start[0] == goal[0]:
+        return [start, goal]
+    middle = (start[1] + goal[1]) // 2
+    return [start, (start[0], middle), (goal[0], middle), goal]
+
+
+def _routeInWindow(obstacles : np.ndarray, window : tuple, start : Point, goal : Point, startDir : int, goalDir : int, budget : int) -> tuple[list[Point] | None, int]:
+    """A* on the routing grid of the obstacles in the window, expanding at most `budget` states;
+    return the simplified route, or None, and the number of states expanded (all of `budget` when
+    the grid is too large, since the grids of larger windows are larger still)"""
+    x0, y0, w, h = window
+    xs = np.unique(np.concatenate([obstacles[:, 0] - PAD, obstacles[:, 2] + PAD, [start[0], goal[0], x0, x0 + w]]))
+    ys = np.unique(np.concatenate([obstacles[:, 1] - PAD, obstacles[:, 3] + PAD, [start[1], goal[1], y0, y0 + h]]))
+    xs = xs[(xs >= x0) & (xs <= x0 + w)]
+    ys = ys[(ys >= y0) & (ys <= y0 + h)]
+    if len(xs) * len(ys) > MAX_GRID_NODES:
+        return None, budget
+
+    # an edge of the grid is blocked when it runs through the inside of a box
+    x1, y1, x2, y2 = obstacles.T
+    insideI = np.searchsorted(xs, x1, 'right'), np.searchsorted(xs, x2, 'left') # lines strictly inside the boxes
+    insideJ = np.searchsorted(ys, y1, 'right'), np.searchsorted(ys, y2, 'left')
+    blockedH = _cover((len(xs) - 1, len(ys)), np.maximum(insideI[0] - 1, 0), np.minimum(insideI[1], len(xs) - 1), *insideJ)
+    blockedV = _cover((len(xs), len(ys) - 1), *insideI, np.maximum(insideJ[0] - 1, 0), np.minimum(insideJ[1], len(ys) - 1))
+
+    path, expansions = _astar(xs.tolist(), ys.tolist(), blockedH.tolist(), blockedV.tolist(),
+                              (int(np.searchsorted(xs, start[0])), int(np.searchsorted(ys, start[1]))),
+                              (int(np.searchsorted(xs, goal[0])), int(np.searchsorted(ys, goal[1]))),
+                              startDir, goalDir, budget)
+    if path is None:
+        return None, expansions
+    points = [(int(xs[i]), int(ys[j])) for i, j in path]
+    return _simplify(points), expansions
+
+
+def _cover(shape : tuple[int, int], i0 : np.ndarray, i1 : np.ndarray, j0 : np.ndarray, j1 : np.ndarray) -> np.ndarray:
+    """boolean array of the given shape, True in the union of the ranges [i0, i1) x [j0, j1)"""
+    counts = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int32)
+    keep = (i0 < i1) & (j0 < j1)
+    i0, i1, j0, j1 = i0[keep], i1[keep], j0[keep], j1[keep]
+    np.add.at(counts, (i0, j0), 1)
+    np.add.at(counts, (i0, j1), -1)
+    np.add.at(counts, (i1, j0), -1)
+    np.add.at(counts, (i1, j1), 1)
+    return counts.cumsum(0).cumsum(1)[:-1, :-1] > 0
+
+
+def _astar(xs : list, ys : list, blockedH : list, blockedV : list, start : tuple[int, int], goal : tuple[int, int], startDir : int, goalDir : int,
+           budget : int) -> tuple[list[tuple[int, int]] | None, int]:
+    """Shortest path on the grid, with BEND_COST per change of direction, U-turns forbidden.
+
+    A state is a grid node and the direction it was entered with, numbered (i * ny + j) * 4 + direction;
+    reaching the goal with another direction than `goalDir` costs one more bend. The heuristic
+    adds to the distance the bends the goal still requires. The search gives up
+    after `budget` states; return the path, or None, and the number of states expanded.
+    """
+    nx, ny = len(xs), len(ys)
+    gx, gy = xs[goal[0]], ys[goal[1]]
+    goalNode = goal[0] * ny + goal[1]
+    startState = (start[0] * ny + start[1]) * 4 + startDir
+    best = {startState: 0.0}
+    parent = {startState: -1} # type: dict[int, int]
+    heap = [(abs(xs[start[0]] - gx) + abs(ys[start[1]] - gy), 0.0, startState)]
+    reverse = (1, 0, 3, 2)
+    expansions = 0
+    while heap and expansions < budget:
+        _, cost, state = heapq.heappop(heap)
+        cost = -cost
+        if cost > best[state]:
+            continue
+        expansions += 1
+        node, direction = divmod(state, 4)
+        if node == goalNode:
+            path = []
+            while state >= 0:
+                path.append(divmod(state // 4, ny))
+                state = parent[state]
+            return path[::-1], expansions
+        i, j = divmod(node, ny)
+        for d, (di, dj) in enumerate(DIRECTIONS):
+            if d == reverse[direction]:
+                continue
+            ni, nj = i + di, j + dj
+            if not (0 <= ni < nx and 0 <= nj < ny):
+                continue
+            if dj == 0 and blockedH[i if di > 0 else ni][j]:
+                continue
+            if di == 0 and blockedV[i][j if dj > 0 else nj]:
+                continue
+            newCost = cost + abs(xs[ni] - xs[i]) + abs(ys[nj] - ys[j]) + (BEND_COST if d != direction else 0)
+            newNode = ni * ny + nj
+            if newNode == goalNode and d != goalDir:
+                newCost += BEND_COST
+            newState = newNode * 4 + d
+            if newCost < best.get(newState, float('inf')):
+                best[newState] = newCost
+                parent[newState] = state
+                # bends still needed: none when heading straight for the goal, one when it is ahead but off
+                # the line, two when it is behind (U-turns being forbidden); arriving in another direction
+                # than `goalDir` takes one more, or two when turning back to it
+                dx, dy = gx - xs[ni], gy - ys[nj]
+                along, across = (dx * di, dy) if dj == 0 else (dy * dj, dx)
+                bends = (0 if across == 0 else 1) if along >= 0 else 2
+                if d == goalDir:
+                    bends = 0 if bends == 0 else 2
+                elif dx or dy:
+                    bends = 2 if bends and d == reverse[goalDir] else max(bends, 1)
+                heapq.heappush(heap, (newCost + abs(dx) + abs(dy) + BEND_COST * bends, -newCost, newState)) # ties go to the deepest state
+    return None, expansions
+
+
+def _simplify(points : list[Point]) -> list[Point]:
+    """remove the points in the middle of straight runs"""
+    simplified = points[:2]
+    for point in points[2:]:
+        a, b = simplified[-2], simplified[-1]
+        if (a[0] == b[0] == point[0]) or (a[1] == b[1] == point[1]):
+            simplified[-1] = point
+        else:
+            simplified.append(point)
+    return simplified
+
+
+def _separateChannels(routes : list[list[Point]]) -> None:
+    """Spread overlapping collinear segments of different routes over parallel channels.
+
+    Only segments between two bends move; the first and last segments of a route stay
+    on their line, since they are attached to the steps of the relation.
+    """
+    offsets = [[[0, 0] for _ in route] for route in routes] # (dx, dy) added to each point
+    for axis in (0, 1): # 0: horizontal segments, on a common y; 1: vertical segments, on a common x
+        along, across = axis, 1 - axis
+        segments = [] # form of (line, start, end, fixed, route index, segment index)
+        for r, route in enumerate(routes):
+            for s in range(len(route) - 1):
+                a, b = route[s], route[s + 1]
+                if a[across] == b[across] and a[along] != b[along]:
+                    fixed = s == 0 or s == len(route) - 2
+                    segments.append((a[across], min(a[along], b[along]), max(a[along], b[along]), fixed, r, s))
+        segments.sort()
+
+        cluster = [] # type: list[tuple]
+        reach = None
+        for segment in [*segments, None]:
+            if segment is not None and cluster and segment[0] == cluster[0][0] and segment[1] < reach: #type: ignore
+                cluster.append(segment)
+                reach = max(reach, segment[2]) #type: ignore
+                continue
+            if len(cluster) > 1:
+                _spread(cluster, offsets, across)
+            if segment is not None:
+                cluster = [segment]
+                reach = segment[2]
+
+    for r, route in enumerate(routes):
+        route[:] = [(x + dx, y + dy) for (x, y), (dx, dy) in zip(route, offsets[r])]
+
+
+def _spread(cluster : list[tuple], offsets : list[list[list[int]]], across : int) -> None:
+    """give each movable segment of the cluster its own channel: 0, +1, -1, +2, -2... times the spacing"""
+    movable = [segment for segment in cluster if not segment[3]]
+    slots = len(movable) + (1 if len(movable) < len(cluster) else 0)
+    spacing = min(CHANNEL_SPACING, (2 * PAD - 2) // max(slots - 1, 1))
+    channel = 1 if len(movable) < len(cluster) else 0 # channel 0 is kept for the fixed segments
+    for _, _, _, _, r, s in sorted(movable, key=lambda segment: (segment[4], segment[5])):
+        offset = (channel + 1) // 2 * spacing * (1 if channel % 2 else -1)
+        offsets[r][s][across] = offset
+        offsets[r][s + 1][across] = offset
+        channel += 1
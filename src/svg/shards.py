@@ -0,0 +1,143 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import colour
+
+try:
+    from .main import createDiagram
+    from .utils import createMissingClasses
+    from .layout import LAYOUT
+    from .routing import ROUTER
+    from .state import LayoutState
+    from .cache import LayoutCache
+    from .customTypes import MemberLimits, NO_LIMITS
+except ImportError:
+    from main import createDiagram
+    from utils import createMissingClasses
+    from layout import LAYOUT
+    from routing import ROUTER
+    from state import LayoutState
+    from cache import LayoutCache
+    from customTypes import MemberLimits, NO_LIMITS
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Shards")
+
+ROOT_PACKAGE = "(root)" # package of the elements outside of any module; a module name cannot hold parentheses
+RELATION_KINDS = ('inheritFrom', 'composition', 'aggregation')
+
+
+def packageOf(name : str, module : str | None = None, depth : int | None = None) -> str:
+    """Package of a class or enum: the module it is defined in, as given by the parser, cut to `depth` parts if given.
+
+    Data without modules (not read from source files) fall back on the dotted prefix of the name.
+    """
+    parts = module.split(".") if module is not None else name.split(".")[:-1]
+    if depth is not None:
+        parts = parts[:depth]
+    return ".".join(part for part in parts if part) or ROOT_PACKAGE
+
+
+def packagesOf(data : dict, depth : int | None = None) -> dict[str, str]:
+    """package of every class and enum of parsed data, by name"""
+    return {name: packageOf(name, element.get('module'), depth) for kind in ('classes', 'enums') for name, element in data[kind].items()}
+
+
+def pageName(output : str, package : str) -> str:
+    """file of the page of `package`, next to the overview `output`; the root package keeps its parentheses, so no module shares its page"""
+    root, ext = os.path.splitext(output)
+    return f"{root}.{package}{ext}"
+
+
+def splitPackages(data : dict, output : str, depth : int | None = None) -> dict[str, dict]:
+    """Split parsed data into one set of data per package, keyed by package.
+
+    The classes and enums of a package keep the relations they have with each other. A class of
+    another package linked to one of them is added to the 'stubs' of the package, with the relations
+    it has with the classes of the package only, and a link to its own page.
+    """
+    packages = packagesOf(data, depth)
+    shards = {} # type: dict[str, dict]
+    for package in dict.fromkeys(packages.values()):
+        shards[package] = {'classes': {}, 'enums': {}, 'stubs': {}}
+
+    def stub(package : str, name : str) -> dict:
+        stubs = shards[package]['stubs']
+        if name not in stubs:
+            stubs[name] = {'href': f"{os.path.basename(pageName(output, packages[name]))}#{name}", **{kind: [] for kind in RELATION_KINDS}}
+        return stubs[name]
+
+    for name, enum in data['enums'].items():
+        shards[packages[name]]['enums'][name] = enum
+    for name, classData in data['classes'].items():
+        package = packages[name]
+        shards[package]['classes'][name] = classData
+        for kind in RELATION_KINDS:
+            for target in classData.get(kind, []):
+                targetPackage = packages.get(target)
+                if targetPackage is not None and targetPackage != package:
+                    stub(package, target) # the target, on the page of the source
+                    stub(targetPackage, name)[kind].append(target) # the source, on the page of the target
+    return shards
+
+
+def packageOverview(data : dict, output : str, depth : int | None = None) -> dict:
+    """data of the overview page: one node per package, with one dependency to each package it has relations with"""
+    packages = packagesOf(data, depth)
+    counts = Counter(packages.values())
+    enums = Counter(packages[name] for name in data['enums'])
+    dependencies = {package: Counter() for package in counts} # type: dict[str, Counter]
+    for name, classData in data['classes'].items():
+        for kind in RELATION_KINDS:
+            for target in classData.get(kind, []):
+                if target in packages and packages[target] != packages[name]:
+                    dependencies[packages[name]][packages[target]] += 1
+    return {
+        'classes': {},
+        'enums': {},
+        'packages': {
+            package: {
+                'href': os.path.basename(pageName(output, package)),
+                'classes': count - enums[package],
+                'enums': enums[package],
+                'dependencies': dict(sorted(dependencies[package].items()))
+            }
+            for package, count in counts.items()
+        }
+    }
+
+
+def _savePage(data : dict, filename : str, color : str, layout : LAYOUT, incremental : bool, cacheDir : str | None, layout_budget : float | None,
+              attempts : int, seed : int | None, router : ROUTER, limits : MemberLimits, saveOptions : dict) -> str:
+    state = LayoutState.load(LayoutState.pathFor(filename)) if incremental else None
+    cache = LayoutCache(cacheDir) if cacheDir is not None else None
+    svg = createDiagram(data, colour.Color(color), layout, state, cache, layout_budget, attempts, seed, router, limits=limits)
+    svg.save(filename, **saveOptions)
+    if state is not None:
+        state.save(LayoutState.pathFor(filename))
+    return filename
+
+
+def saveSharded(data : dict, output : str, color : colour.Color, layout : LAYOUT = LAYOUT.AUTO, depth : int | None = None, incremental : bool = False,
+                cacheDir : str | None = None, layout_budget : float | None = None, attempts : int = 1, seed : int | None = None, router : ROUTER = ROUTER.ELBOW,
+                jobs : int = 1, limits : MemberLimits = NO_LIMITS, **saveOptions) -> dict[str, str]:
+    """Save one page per package, and an overview of the packages to `output`; see `splitPackages` and `packageOverview`.
+
+    With several `jobs`, the pages are laid out and saved by a process pool. `saveOptions` are passed to `SVG.save`.
+    Return the file of each package.
+    """
+    createMissingClasses(data)
+    pages = {package: (shard, pageName(output, package)) for package, shard in splitPackages(data, output, depth).items()}
+    tasks = [(shard, filename) for shard, filename in pages.values()] + [(packageOverview(data, output, depth), output)]
+    options = (color.hex_l, layout, incremental, cacheDir, layout_budget, attempts, seed, router, limits, saveOptions) # a colour.Color cannot be pickled
+    if jobs > 1 and len(tasks) > 1:
+        Logger.debug(f"Saving {len(tasks)} pages in {jobs} processes")
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            for future in [pool.submit(_savePage, shard, filename, *options) for shard, filename in tasks]:
+                future.result()
+    else:
+        for shard, filename in tasks:
+            _savePage(shard, filename, *options)
+    Logger.info(f"saved {len(pages)} package pages and their overview")
+    return {package: filename for package, (_, filename) in pages.items()}
@@ -0,0 +1,147 @@
+import heapq
+import math
+from typing import Hashable, Iterable, Sequence
+
+try:
+    from .packing import packRectangles
+except ImportError:
+    from packing import packRectangles
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.Spatial")
+
+
+Box = tuple[float, float, float, float] # form of (x, y, width, height)
+
+MAX_PROBES = 32 # positions tried around a colliding box before it is set aside (see resolveOverlaps)
+
+
+def intersects(a : Box, b : Box, margin : float = 0) -> bool:
+    """return True if the boxes overlap, or are closer than `margin` from each other"""
+    return a[0] < b[0] + b[2] + margin and b[0] < a[0] + a[2] + margin \
+        and a[1] < b[1] + b[3] + margin and b[1] < a[1] + a[3] + margin
+
+
+class SpatialIndex:
+    """Uniform grid over axis-aligned boxes, each box is stored in every cell it covers"""
+    def __init__(self, cellSize : float):
+        self.__cellSize = max(float(cellSize), 1.0)
+        self.__cells = {} # type: dict[tuple[int, int], set[Hashable]]
+        self.__boxes = {} # type: dict[Hashable, Box]
+
+    def __len__(self) -> int:
+        return len(self.__boxes)
+
+    def __contains__(self, key : Hashable) -> bool:
+        return key in self.__boxes
+
+    def __cellRange(self, box : Box, margin : float = 0) -> Iterable[tuple[int, int]]:
+        x0 = math.floor((box[0] - margin) / self.__cellSize)
+        y0 = math.floor((box[1] - margin) / self.__cellSize)
+        x1 = math.floor((box[0] + box[2] + margin) / self.__cellSize)
+        y1 = math.floor((box[1] + box[3] + margin) / self.__cellSize)
+        return ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    def insert(self, key : Hashable, box : Box) -> None:
+        if key in self.__boxes:
+            self.remove(key)
+        self.__boxes[key] = box
+        for cell in self.__cellRange(box):
+            self.__cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key : Hashable) -> None:
+        box = self.__boxes.pop(key)
+        for cell in self.__cellRange(box):
+            self.__cells[cell].discard(key)
+            if not self.__cells[cell]:
+                del self.__cells[cell]
+
+    def get(self, key : Hashable) -> Box:
+        return self.__boxes[key]
+
+    def query(self, box : Box, margin : float = 0) -> list[Hashable]:
+        """return the keys of the boxes overlapping `box`, or closer than `margin` from it"""
+        candidates = set()
+        for cell in self.__cellRange(box, margin):
+            candidates |= self.__cells.get(cell, set())
+        return [key for key in candidates if intersects(box, self.__boxes[key], margin)]
+
+
+def findFree(index : SpatialIndex, box : Box, margin : float = 0) -> tuple[float, float]:
+    """return the nearest top-left corner, moving `box` right or down, where it collides with nothing in `index`"""
+    x, y, w, h = box
+    blockers = index.query(box, margin)
+    while blockers:
+        right = max(index.get(b)[0] + index.get(b)[2] for b in blockers) + margin
+        down = max(index.get(b)[1] + index.get(b)[3] for b in blockers) + margin
+        if right - x <= down - y:
+            x = right
+        else:
+            y = down
+        blockers = index.query((x, y, w, h), margin)
+    return x, y
+
+
+def _nearestFree(index : SpatialIndex, box : Box, margin : float, origin : tuple[float, float]) -> tuple[float, float] | None:
+    """Return the free top-left corner nearest to that of `box`, or None if MAX_PROBES tries find none.
+
+    Positions are tried nearest first; a blocked one leads to the positions just past its blockers
+    to the right, to the left, below and above, except those left of or above `origin`.
+    """
+    x, y, w, h = box
+    candidates = [(0.0, y, x)]
+    seen = {(x, y)}
+    for _ in range(MAX_PROBES):
+        if not candidates:
+            break
+        _, cy, cx = heapq.heappop(candidates)
+        blockers = [index.get(b) for b in index.query((cx, cy, w, h), margin)]
+        if not blockers:
+            return cx, cy
+        for nx, ny in ((max(b[0] + b[2] for b in blockers) + margin, cy), (min(b[0] for b in blockers) - margin - w, cy),
+                       (cx, max(b[1] + b[3] for b in blockers) + margin), (cx, min(b[1] for b in blockers) - margin - h)):
+            if nx >= origin[0] and ny >= origin[1] and (nx, ny) not in seen:
+                seen.add((nx, ny))
+                heapq.heappush(candidates, (abs(nx - x) + abs(ny - y), ny, nx))
+    return None
+
+
+def resolveOverlaps(boxes : Sequence[Box], margin : float = 0) -> list[tuple[float, float]]:
+    """Nudge boxes so that no two of them overlap, and at least `margin` stays between them.
+
+    Boxes are settled one after the other, top to bottom then left to right, in an index
+    of the settled ones. A box that does not collide stays where it is; otherwise it takes the
+    nearest free position among at most MAX_PROBES tried around it, in any direction but left of
+    or above the area of the boxes. The boxes left without one, as when many of them are piled up
+    at the same place, are then packed together (see `packRectangles`) under all the others.
+    Each box costs at most MAX_PROBES queries of the index.
+    Return the new top-left corner of each box, in input order.
+    """
+    if not boxes:
+        return []
+    cellSize = sum(w + h for _, _, w, h in boxes) / (2 * len(boxes)) + margin
+    index = SpatialIndex(cellSize)
+    origin = (min(x for x, _, _, _ in boxes), min(y for _, y, _, _ in boxes))
+    positions = [(x, y) for x, y, _, _ in boxes]
+    moved = 0
+    aside = [] # type: list[int]
+    for i in sorted(range(len(boxes)), key=lambda i: (boxes[i][1], boxes[i][0], i)):
+        _, _, w, h = boxes[i]
+        position = _nearestFree(index, boxes[i], margin, origin)
+        if position is None:
+            aside.append(i)
+            continue
+        if position != positions[i]:
+            moved += 1
+        index.insert(i, (*position, w, h))
+        positions[i] = position
+    if aside:
+        settled = set(range(len(boxes))) - set(aside)
+        bottom = max(positions[i][1] + boxes[i][3] for i in settled)
+        packed = packRectangles([(boxes[i][2], boxes[i][3]) for i in aside], margin)
+        for i, (x, y) in zip(aside, packed):
+            positions[i] = (origin[0] + x - margin, bottom + y)
+        Logger.debug(f"Packed {len(aside)} boxes with no free position nearby under the others")
+    if moved:
+        Logger.debug(f"Moved {moved} overlapping boxes")
+    return positions
@@ -0,0 +1,66 @@
+import json
+import os
+
+from gamuLogger import Logger
+Logger.setModule("DiagramTool.State")
+
+STATE_VERSION = 1
+
+
+class LayoutState:
+    """Position and size of every element of a previous run, of the form {name: (x, y, width, height)}.
+
+    It also keeps what the output of that run was made of, for `patch`: the digest of the content of
+    every element, the (source, target, type) of every relation in drawing order, and the output options.
+    """
+    def __init__(self, elements : dict[str, tuple[int, int, int, int]] | None = None, layout : str | None = None,
+                 digests : dict[str, str] | None = None, relations : list[tuple[str, str, str]] | None = None, options : dict | None = None):
+        self.elements = dict(elements or {})
+        self.layout = layout
+        self.digests = dict(digests or {})
+        self.relations = list(relations or [])
+        self.options = options
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def __contains__(self, name : str) -> bool:
+        return name in self.elements
+
+    def get(self, name : str) -> tuple[int, int, int, int]:
+        return self.elements[name]
+
+    @staticmethod
+    def pathFor(output : str) -> str:
+        """return the path of the state file kept next to `output`"""
+        return os.path.splitext(output)[0] + ".layout.json"
+
+    @staticmethod
+    def load(filename : str) -> 'LayoutState':
+        """load a state file; return an empty state if it is missing or unreadable"""
+        if not os.path.exists(filename):
+            return LayoutState()
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != STATE_VERSION:
+                raise ValueError(f"unsupported version {data.get('version')}")
+            elements = {name: tuple(box) for name, box in data['elements'].items()}
+            relations = [tuple(relation) for relation in data.get('relations', [])]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            Logger.warning(f"Ignoring layout state {filename}: {e}")
+            return LayoutState()
+        Logger.debug(f"Loaded the position of {len(elements)} elements from {filename}")
+        return LayoutState(elements, data.get('layout'), data.get('digests'), relations, data.get('options')) #type: ignore
+
+    def save(self, filename : str) -> None:
+        with open(filename, 'w') as f:
+            json.dump({
+                'version': STATE_VERSION,
+                'layout': self.layout,
+                'elements': {name: list(box) for name, box in sorted(self.elements.items())},
+                'digests': dict(sorted(self.digests.items())),
+                'relations': [list(relation) for relation in self.relations],
+                'options': self.options
+            }, f, indent=4)
+        Logger.debug(f"Saved the position of {len(self.elements)} elements to {filename}")
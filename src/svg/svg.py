@@ -1,143 +1,324 @@
+import gzip
+import io
+import time
+from collections import Counter
+from typing import BinaryIO
+
 import lxml.etree as ET
 
-from typing import Sequence
 import networkx as nx 
-from scipy.optimize import linear_sum_assignment
-import numpy as np
 import colour
+import numpy as np
 
 try:
-    from .customTypes import Class, _Enum as Enum, Relation, Element
-    from .utils import groupBy
+    from .customTypes import Relation, Element, Style, Markers, LodScript
+    from .layout import LAYOUT, layoutComponents, isFallback
+    from .packing import packRectangles
+    from .spatial import SpatialIndex, findFree, resolveOverlaps
+    from .state import LayoutState
+    from .cache import LayoutCache
+    from .profiling import Profile
+    from .metrics import LayoutMetrics, computeMetrics
+    from .routing import ROUTER, routeRelations
+    from .model import DiagramModel
+    from .geometry import relationAnchors
+    from .render import RENDERER, writeFragments
+    from .text import FONT_FAMILY
 except ImportError:
-    from customTypes import Class, _Enum as Enum, Relation, Element
-    from utils import groupBy
+    from customTypes import Relation, Element, Style, Markers, LodScript
+    from layout import LAYOUT, layoutComponents, isFallback
+    from packing import packRectangles
+    from spatial import SpatialIndex, findFree, resolveOverlaps
+    from state import LayoutState
+    from cache import LayoutCache
+    from profiling import Profile
+    from metrics import LayoutMetrics, computeMetrics
+    from routing import ROUTER, routeRelations
+    from model import DiagramModel
+    from geometry import relationAnchors
+    from render import RENDERER, writeFragments
+    from text import FONT_FAMILY
     
 from gamuLogger import Logger
 Logger.setModule("DiagramTool.SVG")
     
 SPACE = 100
-
-
-
-def assign_to_grid(G : nx.Graph, grid, vertex_sizes, margin):
-    # Calculate the cost matrix based on distances between vertices and grid points
-    cost_matrix = []
-    vertex_list = list(G.nodes)
-    for v in vertex_list:
-        v_cost = []
-        for gx, gy in grid:
-            # Add a cost proportional to the sum of vertex sizes (to maintain spacing)
-            size_with_margin = sum([dim + margin for dim in vertex_sizes[v]])
-            v_cost.append(size_with_margin + np.linalg.norm([gx, gy]))
-        cost_matrix.append(v_cost)
-    
-    # Solve assignment problem to minimize total cost
-    row_ind, col_ind = linear_sum_assignment(cost_matrix)
-    assigned_positions = {vertex_list[i]: grid[j] for i, j in zip(row_ind, col_ind)}
-    
-    counter = 0
-    for k, v in assigned_positions.items():
-        assigned_positions[k] = (v[0] + margin, v[1] + margin)
-        Logger.debug(f"Assigned {k} to {assigned_positions[k]}")
-    
-    return assigned_positions
-
+MINIFY_PRECISION = 1 # decimals kept in the coordinates of a minified output
 
 
 class SVG:
+    """A diagram; the SVG nodes of its elements and relations are only built while it is written"""
     def __init__(self, color : colour.Color) -> None:
-        self.__tree = ET.Element("svg", None, None)
-        self.__tree.attrib['xmlns'] = "http://www.w3.org/2000/svg"
+        self.__attrib = {
+            'xmlns': "http://www.w3.org/2000/svg",
+            'font-family': FONT_FAMILY # the font the boxes are sized for
+        }
+        self.__items = [] # type: list[Element|Relation] # in drawing order
         self.__objects = []
+        self.__relations = [] # type: list[Relation]
         self.__color = color
 
     def append(self, element) -> None:
         if isinstance(element, Element):
             self.__objects.append(element)
-        self.__tree.append(element.build(self.__color))
+        elif isinstance(element, Relation):
+            self.__relations.append(element)
+        self.__items.append(element)
         
-    def save(self, filename : str, showBorder : bool = False) -> None:
-        with open(filename, "w") as file:
-            file.write(self.toString(showBorder))
+    def save(self, filename : str, showBorder : bool = False, minify : bool = False, precision : int = MINIFY_PRECISION, compress : bool = False,
+             renderer : RENDERER = RENDERER.LXML, jobs : int = 1, lod : bool = False, reuse : dict[int, str] | None = None) -> None:
+        """write the diagram to `filename`, gzip-compressed if `compress` is set or the name ends with .svgz"""
+        if compress or filename.endswith(".svgz"):
+            with gzip.open(filename, "wb") as file:
+                self.write(file, showBorder, minify, precision, renderer, jobs, lod, reuse)
+        else:
+            with open(filename, "wb") as file:
+                self.write(file, showBorder, minify, precision, renderer, jobs, lod, reuse)
         
     def attrib(self, key, value) -> None:
-        self.__tree.attrib[key] = value
-        
-    def toString(self, showBorder : bool = False) -> str:
-        # calculate width and height of svg
+        self.__attrib[key] = value
+    
+    def size(self) -> tuple[int, int]:
+        """width and height of the canvas"""
         width = max(int(obj.SE[0]) for obj in self.__objects) + SPACE
         height = max(int(obj.SE[1]) for obj in self.__objects) + SPACE
-        self.attrib('width', f"{width}")
-        self.attrib('height', f"{height}")
+        return width, height
+    
+    def write(self, stream : BinaryIO, showBorder : bool = False, minify : bool = False, precision : int = MINIFY_PRECISION, renderer : RENDERER = RENDERER.LXML,
+              jobs : int = 1, lod : bool = False, reuse : dict[int, str] | None = None) -> None:
+        """Write the diagram to a binary stream, one element at a time.
+
+        The canvas size is computed first; then the group of each element and relation is
+        built, written and dropped, so only one of them is held in memory at once. With
+        `minify`, nothing is indented and coordinates are rounded to `precision` decimals.
+        The fast renderer writes the same bytes from text templates, without lxml elements.
+        With several `jobs`, the items are rendered in chunks by a process pool; the output is the same.
+        With `lod`, the member rows of the boxes are only shown once the diagram is drawn large enough.
+        The items whose index is in `reuse` are written as the given text instead, see `patch.reusable`.
+        """
+        pretty = not minify
+        digits = precision if minify else None
+        width, height = self.size()
+        attrib = {**self.__attrib, 'width': f"{width}", 'height': f"{height}", 'color': self.__color.hex}
+        head = [Style(minify, lod), Markers()]
+        if lod:
+            attrib['viewBox'] = f"0 0 {width} {height}" # so that the diagram scales with the size it is given
+            attrib['class'] = "overview" # until the script finds the diagram drawn large enough
+            head.append(LodScript())
+        if renderer == RENDERER.FAST or jobs > 1 or reuse:
+            tail = [self.buildBorder(width, height)] if showBorder else []
+            items = [reuse.get(i, item) for i, item in enumerate(self.__items)] if reuse else self.__items
+            writeFragments(stream, attrib, head, items, tail, digits, pretty, renderer, jobs, lod)
+            return
+        with ET.xmlfile(stream, encoding="utf-8") as xf:
+            with xf.element("svg", attrib):
+                if pretty:
+                    xf.write("\n")
+                for node in head:
+                    xf.write(node, pretty_print=pretty)
+                for item in self.__items:
+                    xf.write(item.build(digits, lod), pretty_print=pretty)
+                if showBorder:
+                    xf.write(self.buildBorder(width, height), pretty_print=pretty)
+        
+    @property
+    def items(self) -> list[Element | Relation]:
+        """elements and relations, in drawing order"""
+        return self.__items
+    
+    def metrics(self) -> LayoutMetrics:
+        """measure the quality of the diagram: crossings, relations through boxes, overlaps, edge length and fill ratio"""
+        return computeMetrics(self.__objects, self.__relations)
         
-        if showBorder:
-            self.drawBorder(width, height)
-        return ET.tostring(self.__tree, pretty_print=True).decode("utf-8") #type: ignore
+    def toString(self, showBorder : bool = False, minify : bool = False, precision : int = MINIFY_PRECISION, renderer : RENDERER = RENDERER.LXML,
+                 jobs : int = 1, lod : bool = False) -> str:
+        stream = io.BytesIO()
+        self.write(stream, showBorder, minify, precision, renderer, jobs, lod)
+        return stream.getvalue().decode("utf-8")
 
-    def placeObjects(self, classes : Sequence[Class], enums : Sequence[Enum]) -> None:
+    def placeObjects(self, model : DiagramModel, layout : LAYOUT = LAYOUT.AUTO, state : LayoutState | None = None, cache : LayoutCache | None = None,
+                     budget : float | None = None, attempts : int = 1, seed : int | None = None, profile : Profile | None = None) -> None:
+        """place every element of the model; elements found unchanged in `state` keep their previous position, and `state` is updated.
+        A full layout is looked up in `cache` first, and stored there once computed. A layout running longer than
+        `budget` seconds returns the best placement it has so far. With several `attempts`, each group of classes is
+        laid out from several seeds, starting at `seed`, and the best result is kept."""
+        profile = profile or Profile()
+        with profile.step("layout"):
+            pinned = self.__pinned(model, layout, state)
+            if pinned:
+                positions = self.__placeAround(model, pinned)
+                profile.note(f"layout: kept {len(pinned)} elements in place, placed {len(model) - len(pinned)}")
+            elif cache is not None:
+                positions = self.__cachedLayout(model, layout, cache, budget, attempts, seed, profile)
+            else:
+                positions = self.__budgetedLayout(model, layout, budget, attempts, seed, profile)[0]
+        
+        with profile.step("place"):
+            model.place(positions)
+            for obj in model.elements:
+                self.append(obj)
         
+        if state is not None:
+            state.layout = str(layout)
+            state.elements = {obj.name: obj.box for obj in model.elements}
+    
+    def __budgetedLayout(self, model : DiagramModel, layout : LAYOUT, budget : float | None, attempts : int, seed : int | None, profile : Profile) -> tuple[list[tuple[int, int]], bool]:
+        """lay out the whole model within `budget`; return the positions, and whether the budget cut the layout short"""
+        start = time.time()
+        positions, methods = self.__layout(model, layout, None if budget is None else start + budget, attempts, seed)
+        degraded = any(isFallback(method) for method in methods)
+        used = ", ".join(f"{method} for {count}" for method, count in Counter(methods).items())
+        if budget is not None:
+            profile.note(f"layout budget: {time.time() - start:.3f}s of {budget:.3f}s; components placed by {used or 'nothing'}")
+        elif layout == LAYOUT.AUTO:
+            profile.note(f"layout: components placed by {used or 'nothing'}")
+        if degraded:
+            Logger.warning(f"Layout time budget of {budget}s spent, some components got a cheaper placement")
+        return positions, degraded
+    
+    def __layout(self, model : DiagramModel, layout : LAYOUT, deadline : float | None = None, attempts : int = 1, seed : int | None = None) -> tuple[list[tuple[int, int]], list[str]]:
+        """lay out the whole model from scratch; return the positions, and the method that placed each component"""
         # place classes
-        classes_index = list(enumerate(classes)) # form of (index, obj)
-        vertices = range(len(classes))
-        edges = [] # form of (source_index, target_index)
-        for i, obj in classes_index:
-            # inheritances
-            for inh in obj.inheritFrom:
-                target_index = next(index for index, o in classes_index if o.name == inh)
-                edges.append((i, target_index))
-            # compositions
-            for comp in obj.composition:
-                target_index = next(index for index, o in classes_index if o.name == comp)
-                edges.append((i, target_index))
-            # aggregations
-            for agg in obj.aggregation:
-                target_index = next(index for index, o in classes_index if o.name == agg)
-                edges.append((i, target_index))
-                
-        vertexSizes = { i: (c.width, c.height) for i, c in classes_index}
+        classes = model.classes
+        vertexSizes = { i: (c.width, c.height) for i, c in enumerate(classes)}
         
         G = nx.Graph()
-        G.add_nodes_from(vertices)
-        G.add_edges_from(edges)
+        G.add_nodes_from(range(len(classes)))
+        G.add_edges_from(model.edges())
         
-        x_spacing = max(c.width for c in classes) + SPACE
-        y_spacing = max(c.height for c in classes) + SPACE
-        grid = [(x * x_spacing, y * y_spacing) for x in range(len(classes)) for y in range(len(classes))]
+        # lay out each connected component on its own
+        components = [G.subgraph(c).copy() for c in sorted(nx.connected_components(G), key=min)]
+        levels = dict(enumerate(model.hierarchy.levels))
+        results = layoutComponents(components, vertexSizes, SPACE, layout, deadline, attempts, seed, levels)
+        placements = [placement for placement, _ in results]
         
-        assigned_positions = assign_to_grid(G, grid, vertexSizes, SPACE)
+        # then pack the components and the enums together
+        boxes = [] # form of (width, height)
+        origins = [] # top-left corner of each component
+        for placement in placements:
+            left = min(x for x, _ in placement.values())
+            top = min(y for _, y in placement.values())
+            right = max(x + vertexSizes[i][0] for i, (x, _) in placement.items())
+            bottom = max(y + vertexSizes[i][1] for i, (_, y) in placement.items())
+            boxes.append((right - left, bottom - top))
+            origins.append((left, top))
+        boxes += [(obj.width, obj.height) for obj in model.enums]
+        packed = packRectangles(boxes, SPACE)
         
-        for i, obj in classes_index:
-            obj.place(*assigned_positions[i])
-            self.append(obj)
+        positions = [(0, 0)] * len(model)
+        for placement, (left, top), (x, y) in zip(placements, origins, packed):
+            for i, (vx, vy) in placement.items():
+                positions[i] = (x + vx - left, y + vy - top)
+        positions[len(classes):] = packed[len(placements):]
         
-        # place enums (all in one line)
-        y = max(int(obj.SE[1]) for obj in classes) + SPACE
-        x = SPACE
-        for obj in enums:
-            obj.place(x, y) 
-            self.append(obj)
-            x += obj.width + 30
+        # whatever the layout did, no two elements may overlap
+        boxes = [(x, y, obj.width, obj.height) for obj, (x, y) in zip(model.elements, positions)]
+        return resolveOverlaps(boxes, SPACE // 2), [method for _, method in results]
+    
+    def __cachedLayout(self, model : DiagramModel, layout : LAYOUT, cache : LayoutCache, budget : float | None, attempts : int, seed : int | None, profile : Profile) -> list[tuple[int, int]]:
+        key = LayoutCache.key(model, layout, space=SPACE, attempts=attempts, seed=seed)
+        cached = cache.get(key)
+        if cached is not None:
+            profile.note("layout: loaded from the cache")
+            return [cached[obj.name] for obj in model.elements]
+        positions, degraded = self.__budgetedLayout(model, layout, budget, attempts, seed, profile)
+        if not degraded: # a layout cut short by the budget is not worth reusing
+            cache.put(key, {obj.name: position for obj, position in zip(model.elements, positions)})
+        return positions
+    
+    def __pinned(self, model : DiagramModel, layout : LAYOUT, state : LayoutState | None) -> dict[int, tuple[int, int]]:
+        """return the previous position of the elements of `state` whose size did not change"""
+        if state is None or len(state) == 0:
+            return {}
+        if state.layout != str(layout):
+            Logger.info(f"Layout changed from {state.layout} to {layout}, placing every element again")
+            return {}
+        pinned = {}
+        for i, obj in enumerate(model.elements):
+            if obj.name in state:
+                x, y, width, height = state.get(obj.name)
+                if (width, height) == (obj.width, obj.height):
+                    pinned[i] = (x, y)
+        return pinned
+    
+    def __placeAround(self, model : DiagramModel, pinned : dict[int, tuple[int, int]]) -> list[tuple[int, int]]:
+        """keep pinned elements in place, and put the others in the free space next to the elements they are linked to"""
+        elements = model.elements
+        cellSize = sum(obj.width + obj.height for obj in elements) // (2 * len(elements)) + SPACE
+        index = SpatialIndex(cellSize)
+        positions = [None] * len(elements) # type: list[tuple[int, int]|None]
+        for i, (x, y) in pinned.items():
+            positions[i] = (x, y)
+            index.insert(i, (x, y, elements[i].width, elements[i].height))
         
-            
-    def placeRelations(self, objects : Sequence[Element], data : dict) -> None:
-        for sourceName, sourceData in data['classes'].items():
-            source = next(obj for obj in objects if obj.name == sourceName)
-            
+        neighbours = [[] for _ in elements] # type: list[list[int]]
+        for adjacency in (model.inheritance, model.composition, model.aggregation, model.dependency):
+            for i, targets in enumerate(adjacency):
+                for target in targets:
+                    neighbours[i].append(target)
+                    neighbours[target].append(i)
+        
+        # elements linked to nothing already placed are lined up under the previous diagram
+        left = min(x for x, _ in pinned.values())
+        right = max(x + elements[i].width for i, (x, _) in pinned.items())
+        bottom = max(y + elements[i].height for i, (_, y) in pinned.items()) + SPACE
+        cursor = left
+        
+        # parents before children, so that children can be placed under them
+        for i in [*model.hierarchy.order, *range(len(model.classes), len(elements))]:
+            if positions[i] is not None:
+                continue
+            obj = elements[i]
+            placed = [n for n in neighbours[i] if positions[n] is not None]
+            if placed:
+                center = sum(positions[n][0] + elements[n].width // 2 for n in placed) // len(placed) #type: ignore
+                start = (center - obj.width // 2, max(positions[n][1] + elements[n].height for n in placed) + SPACE) #type: ignore
+            else:
+                start = (cursor, bottom)
+            x, y = findFree(index, (max(start[0], SPACE), start[1], obj.width, obj.height), SPACE)
+            if not placed:
+                cursor = x + obj.width + SPACE if x + obj.width + SPACE < right else left
+            positions[i] = (x, y)
+            index.insert(i, (x, y, obj.width, obj.height))
+        
+        Logger.info(f"Kept {len(pinned)} elements in place, placed {len(elements) - len(pinned)} new or resized ones")
+        return positions #type: ignore
+    
+    def placeRelations(self, model : DiagramModel, router : ROUTER = ROUTER.ELBOW) -> None:
+        relations = []
+        ends = [] # type: list[tuple[int, int]]
+        for i, source in enumerate(model.classes):
             # place inheritance relations
-            for targetName in sourceData['inheritFrom']:
-                target = next(obj for obj in objects if obj.name == targetName)
-                relation = Relation(source, target, Relation.TYPE.INHERITANCE)
-                self.append(relation)
+            for target in model.inheritance[i]:
+                relations.append(Relation(source, model.elements[target], Relation.TYPE.INHERITANCE))
+                ends.append((i, target))
                 
             # place composition relations
-            for targetName in sourceData['composition']:
-                target = next(obj for obj in objects if obj.name == targetName)
-                relation = Relation(source, target, Relation.TYPE.COMPOSITION)
-                self.append(relation)
+            for target in model.composition[i]:
+                relations.append(Relation(source, model.elements[target], Relation.TYPE.COMPOSITION))
+                ends.append((i, target))
+            
+            # place dependency relations
+            for target in model.dependency[i]:
+                relations.append(Relation(source, model.elements[target], Relation.TYPE.DEPENDENCY))
+                ends.append((i, target))
+        
+        # sides and anchor points of all relations, from the boxes of the model
+        sources, targets = np.array(ends, dtype=np.int64).reshape(-1, 2).T
+        anchors = relationAnchors(model.boxes, sources, targets)
+        for relation, startPoint, startStep, arrowStep, endPoint in zip(relations, *(array.tolist() for array in anchors)):
+            relation.anchorPoints = (tuple(startPoint), tuple(startStep), tuple(arrowStep), tuple(endPoint))
+        
+        if router == ROUTER.ORTHOGONAL:
+            for relation, route in zip(relations, routeRelations(model.elements, relations)):
+                relation.route = route
+        
+        for relation in relations:
+            self.append(relation)
 
 
-    def drawBorder(self, width : int, height : int) -> None:
+    @staticmethod
+    def buildBorder(width : int, height : int) -> ET._Element:
         border = ET.Element("rect", None, None)
         border.attrib['x'] = "0"
         border.attrib['y'] = "0"
@@ -146,4 +327,4 @@ class SVG:
         border.attrib['fill'] = "none"
         border.attrib['stroke'] = "red"
         border.attrib['stroke-width'] = "1"
-        self.__tree.append(border)
\ No newline at end of file
+        return border
\ No newline at end of file
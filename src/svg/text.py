@@ -0,0 +1,63 @@
+import math
+import unicodedata
+from functools import lru_cache
+from typing import Iterable
+
+# font of every text of the diagram; Arial and Liberation Sans share the advance widths of Helvetica
+FONT_FAMILY = "Helvetica, Arial, 'Liberation Sans', sans-serif"
+
+UNITS_PER_EM = 1000
+DEFAULT_ADVANCE = 556 # characters missing from the table
+WIDE_ADVANCE = 1000   # east asian wide and fullwidth characters
+
+# advance widths of Helvetica (regular and oblique), in 1/1000 of the font size
+ADVANCE_WIDTHS = {
+    ' ': 278, '!': 278, '"': 355, '#': 556, '$': 556, '%': 889, '&': 667, "'": 191,
+    '(': 333, ')': 333, '*': 389, '+': 584, ',': 278, '-': 333, '.': 278, '/': 278,
+    '0': 556, '1': 556, '2': 556, '3': 556, '4': 556, '5': 556, '6': 556, '7': 556,
+    '8': 556, '9': 556, ':': 278, ';': 278, '<': 584, '=': 584, '>': 584, '?': 556,
+    '@': 1015, 'A': 667, 'B': 667, 'C': 722, 'D': 722, 'E': 667, 'F': 611, 'G': 778,
+    'H': 722, 'I': 278, 'J': 500, 'K': 667, 'L': 556, 'M': 833, 'N': 722, 'O': 778,
+    'P': 667, 'Q': 778, 'R': 722, 'S': 667, 'T': 611, 'U': 722, 'V': 667, 'W': 944,
+    'X': 667, 'Y': 667, 'Z': 611, '[': 278, '\\': 278, ']': 278, '^': 469, '_': 556,
+    '`': 333, 'a': 556, 'b': 556, 'c': 500, 'd': 556, 'e': 556, 'f': 278, 'g': 556,
+    'h': 556, 'i': 222, 'j': 222, 'k': 500, 'l': 222, 'm': 833, 'n': 556, 'o': 556,
+    'p': 556, 'q': 556, 'r': 333, 's': 500, 't': 278, 'u': 556, 'v': 500, 'w': 722,
+    'x': 500, 'y': 500, 'z': 500, '{': 334, '|': 260, '}': 334, '~': 584,
+    '\u00a0': 278, '«': 556, '·': 278, '»': 556, 'à': 556, 'â': 556,
+    'ç': 500, 'è': 556, 'é': 556, 'ê': 556, 'ë': 556, 'î': 278,
+    'ï': 278, 'ô': 556, 'ù': 556, 'û': 556, 'ü': 556,
+    '–': 556, '—': 1000, '…': 1000, '←': 1000, '→': 1000,
+}
+
+
+def _advance(char : str) -> int:
+    width = ADVANCE_WIDTHS.get(char)
+    if width is not None:
+        return width
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return WIDE_ADVANCE
+    if unicodedata.combining(char):
+        return 0
+    return DEFAULT_ADVANCE
+
+
+@lru_cache(maxsize=1 << 16)
+def textUnits(text : str) -> int:
+    """advance width of the text, in 1/1000 of the font size"""
+    return sum(ADVANCE_WIDTHS[char] if char in ADVANCE_WIDTHS else _advance(char) for char in text)
+
+
+def textWidth(text : str, fontsize : float) -> int:
+    """width of the text drawn in FONT_FAMILY at `fontsize` pixels, rounded up to a pixel"""
+    return math.ceil(textUnits(text) * fontsize / UNITS_PER_EM)
+
+
+def textWidths(texts : Iterable[str], fontsize : float) -> list[int]:
+    """width of each text at the same font size, see `textWidth`"""
+    return [math.ceil(textUnits(text) * fontsize / UNITS_PER_EM) for text in texts]
+
+
+def textHeight(fontsize : float) -> int:
+    """height of a row of text, with room for the descenders"""
+    return math.ceil(fontsize) + 5
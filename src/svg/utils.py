@@ -1,16 +1,21 @@
 from typing import Callable, Sequence
 import lxml.etree as ET
 
+try:
+    from .text import textWidth, textHeight
+except ImportError:
+    from text import textWidth, textHeight
+
 from gamuLogger import Logger
 
 Logger.setModule("DiagramTool.SVG_Utils")
 
 
 def getTextWidth(text : str, fontsize : int) -> int:
-    return len(text) * 10 * (fontsize // 16)
+    return textWidth(text, fontsize)
 
 def getTextHeight(fontsize : int) -> int:
-    return fontsize + 5
+    return textHeight(fontsize)
 
 
 def visibiliyToUML(visibility : str):
@@ -42,12 +47,15 @@ def createMissingClasses(data : dict) -> None:
     for className in classNames:
         classData = data['classes'][className]
         for parent in classData['inheritFrom']:
-            if parent not in data['classes']:
+            if parent not in data['classes'] and parent not in data.get('stubs', {}):
                 data['classes'][parent] = {
                     "attributes": {},
                     "properties": {},
                     "methods": {},
-                    "inheritFrom": []
+                    "inheritFrom": [],
+                    "inheritedBy": [],
+                    "composition": [],
+                    "aggregation": []
                 }
 
 def groupBy(data: Sequence, key: Callable):